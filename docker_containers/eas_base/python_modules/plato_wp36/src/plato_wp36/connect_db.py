@@ -10,16 +10,65 @@ import warnings
 import MySQLdb
 import os
 import re
+import shutil
 import sqlite3
+import subprocess
 import gzip
 
-from typing import Optional
+from typing import List, Optional
 
 from .settings import Settings
 
 warnings.filterwarnings("ignore", ".*Unknown table .*")
 
 
+def gzip_compressor():
+    """
+    Return the name of the command we use to compress and decompress gzipped database dumps. We use pigz, which
+    compresses using all available CPU cores, if it is installed, or gzip otherwise.
+
+    :return:
+        str
+    """
+    return "pigz" if shutil.which("pigz") is not None else "gzip"
+
+
+def run_pipeline(producer_arguments: List[str], consumer_arguments: List[str], consumer_stdout=None):
+    """
+    Run two processes, with the output of the first piped into the input of the second, and check that both succeed.
+
+    :param producer_arguments:
+        The command-line arguments of the process which writes into the pipe.
+    :param consumer_arguments:
+        The command-line arguments of the process which reads from the pipe.
+    :param consumer_stdout:
+        File object to which the consumer's output should be sent, or None to inherit our own.
+    :return:
+        None
+    """
+
+    producer = subprocess.Popen(producer_arguments, stdout=subprocess.PIPE)
+    consumer_status = None
+    try:
+        try:
+            consumer = subprocess.Popen(consumer_arguments, stdin=producer.stdout, stdout=consumer_stdout)
+        finally:
+            # Close our copy of the pipe, so the producer gets SIGPIPE, rather than blocking, if the consumer exits
+            producer.stdout.close()
+        consumer_status = consumer.wait()
+    finally:
+        # Do not leave the producer running if the consumer failed
+        if consumer_status != 0 and producer.poll() is None:
+            producer.kill()
+        producer_status = producer.wait()
+
+    # Check that both processes succeeded
+    if consumer_status != 0:
+        raise subprocess.CalledProcessError(returncode=consumer_status, cmd=consumer_arguments)
+    if producer_status != 0:
+        raise subprocess.CalledProcessError(returncode=producer_status, cmd=producer_arguments)
+
+
 class DatabaseInterface:
     """
     Class defining a unified interface for interacting with SQL databases.
@@ -128,6 +177,13 @@ class DatabaseInterface:
         """
         raise NotImplementedError
 
+    def parameterised_query_iterate(self, sql: str, parameters: Optional[tuple] = None, batch_size: int = 1000):
+        """
+        Execute a database query with a single set of input parameters, and iterate over the results. The results
+        are fetched from the database in batches, rather than all being held in memory at once.
+        """
+        raise NotImplementedError
+
     def fetchall(self):
         """
         Fetch all results.
@@ -259,19 +315,20 @@ class DatabaseInterfaceMySql(DatabaseInterface):
         # Recreate database from scratch
         # We manually specify a UTF8 character set to ensure the database can handle non-ASCII characters, and
         # also specify that all columns should use case-sensitive matching (which is not default in MySQL!!)
-        cmd = """
-echo 'DROP DATABASE IF EXISTS {:s};' | mysql --defaults-extra-file={:s}
-""".format(self.db_database, db_config_filename)
-        os.system(cmd)
-        cmd = ("""
-echo 'CREATE DATABASE {:s} CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_as_cs;' | mysql --defaults-extra-file={:s}
-""".format(self.db_database, db_config_filename))
-        os.system(cmd)
+        sql_stream = """
+DROP DATABASE IF EXISTS {0:s};
+CREATE DATABASE {0:s} CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_as_cs;
+USE {0:s};
+""".format(self.db_database)
 
         # Create basic database schema
         if initialise_schema:
-            cmd = "cat {:s} | mysql --defaults-extra-file={:s} {:s}".format(sql, db_config_filename, self.db_database)
-            os.system(cmd)
+            with open(sql) as f:
+                sql_stream += f.read()
+
+        # Send all the SQL to a single MySQL client session
+        subprocess.run(["mysql", "--defaults-extra-file={:s}".format(db_config_filename)],
+                       input=sql_stream, text=True, check=True)
 
     def connect(self):
         """
@@ -362,6 +419,24 @@ db_database: {:s}
         """
         self.db_cursor.executemany(sql, parameters)
 
+    def parameterised_query_iterate(self, sql: str, parameters: Optional[tuple] = None, batch_size: int = 1000):
+        """
+        Execute a database query with a single set of input parameters, and iterate over the results. The results
+        are streamed from the server in batches, rather than all being held in memory at once.
+        """
+
+        # Use a server-side cursor, which leaves the results on the server until we fetch them
+        cursor = self.db.cursor(cursorclass=MySQLdb.cursors.SSDictCursor)
+        try:
+            cursor.execute(sql, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
     def dump(self, output_filename: str):
         """
         Create a gzipped database dump to a file.
@@ -370,11 +445,13 @@ db_database: {:s}
             The filename for the database dump
         """
 
-        # Create MySQL database dump
+        # Create MySQL database dump, streaming it straight into the compressor
         db_config_filename = self.sql_login_config_path(engine_name="mysql")[0]
-        cmd = "mysqldump --defaults-extra-file={:s} {:s} | gzip > {:s}".format(db_config_filename, self.db_database,
-                                                                               output_filename)
-        os.system(cmd)
+        with open(output_filename, "wb") as output:
+            run_pipeline(producer_arguments=["mysqldump", "--defaults-extra-file={:s}".format(db_config_filename),
+                                             self.db_database],
+                         consumer_arguments=[gzip_compressor(), "-c"],
+                         consumer_stdout=output)
 
     def restore(self, input_filename: str):
         """
@@ -388,11 +465,11 @@ db_database: {:s}
         self.close()
         self.create_database(initialise_schema=False)
 
-        # Import the contents of the database dump
+        # Import the contents of the database dump, streaming it straight out of the decompressor
         db_config_filename = self.sql_login_config_path(engine_name="mysql")[0]
-        cmd = ("zcat < '{}' | mysql --defaults-extra-file={:s} {}".format(input_filename, db_config_filename,
-                                                                          self.db_database))
-        os.system(cmd)
+        run_pipeline(producer_arguments=[gzip_compressor(), "-dc", input_filename],
+                     consumer_arguments=["mysql", "--defaults-extra-file={:s}".format(db_config_filename),
+                                         self.db_database])
 
         # Reconnect to database
         self.connect()
@@ -576,6 +653,31 @@ db_database: {:s}
         sql = re.sub(r"%s", r"?", sql)
         self.db_cursor.executemany(sql, parameters)
 
+    def parameterised_query_iterate(self, sql: str, parameters: Optional[tuple] = None, batch_size: int = 1000):
+        """
+        Execute a database query with a single set of input parameters, and iterate over the results. The results
+        are fetched from the database in batches, rather than all being held in memory at once.
+        """
+
+        # Keep sqlite3 happy, even if there are no parameters
+        if parameters is None:
+            parameters = ()
+
+        # sqlite3 uses ? as a placeholder for SQL parameters, not %s
+        sql = re.sub(r"%s", r"?", sql)
+
+        # Use a separate cursor, so that other queries can be run while we iterate over the results
+        cursor = self.db.cursor()
+        try:
+            cursor.execute(sql, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
     def dump(self, output_filename: str):
         """
         Create a gzipped database dump to a file.
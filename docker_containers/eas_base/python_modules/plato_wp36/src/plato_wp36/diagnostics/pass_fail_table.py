@@ -61,11 +61,17 @@ ORDER BY schedulingAttemptId;
                 if len(results) < 1:
                     continue
 
+                # Fetch the metadata associated with all the tasks and execution attempts at once
+                metadata_by_task_id = task_db.metadata_fetch_all_multiple(
+                    task_ids=list({result['taskId'] for result in results}))
+                metadata_by_attempt_id = task_db.metadata_fetch_all_multiple(
+                    scheduling_attempt_ids=[result['schedulingAttemptId'] for result in results])
+
                 # Fetch numerical input parameters to each task
                 metadata_per_item = []
                 all_parameter_names = []
                 for result in results:
-                    metadata_in = task_db.metadata_fetch_all(task_id=result['taskId'])
+                    metadata_in = dict(metadata_by_task_id[result['taskId']])
                     metadata_per_item.append(metadata_in)
 
                     for keyword in tuple(metadata_in.keys()):
@@ -99,7 +105,7 @@ ORDER BY schedulingAttemptId;
                     }
 
                     # Fetch output metadata
-                    metadata_out = task_db.metadata_fetch_all(scheduling_attempt_id=result['schedulingAttemptId'])
+                    metadata_out = metadata_by_attempt_id[result['schedulingAttemptId']]
 
                     # Only display items with a pass/fail outcome
                     if 'outcome' not in metadata_out:
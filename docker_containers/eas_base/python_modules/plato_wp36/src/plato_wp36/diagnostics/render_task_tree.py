@@ -78,17 +78,16 @@ ORDER BY x.taskId;
                 # Search for node
                 task_db.db_handle.parameterised_query("""
 SELECT t.taskId, t.jobName, ett.taskTypeName, t.parentTask,
-   (SELECT COUNT(*) FROM eas_scheduling_attempt x WHERE x.taskId = t.taskId AND x.isQueued) AS runs_queued,
-   (SELECT COUNT(*) FROM eas_scheduling_attempt x WHERE x.taskId = t.taskId AND
-                    (x.errorFail OR (x.isRunning AND x.latestHeartbeat < {min_heartbeat:f}))) AS runs_stalled,
-   (SELECT COUNT(*) FROM eas_scheduling_attempt x WHERE x.taskId = t.taskId AND
-                    x.isRunning AND NOT x.errorFail AND x.latestHeartbeat > {min_heartbeat:f}) AS runs_running,
-   (SELECT COUNT(*) FROM eas_scheduling_attempt x WHERE x.taskId = t.taskId AND
-                    x.isFinished AND NOT x.errorFail) AS runs_done
+   SUM(CASE WHEN x.isQueued THEN 1 ELSE 0 END) AS runs_queued,
+   SUM(CASE WHEN x.errorFail OR (x.isRunning AND x.latestHeartbeat < %s) THEN 1 ELSE 0 END) AS runs_stalled,
+   SUM(CASE WHEN x.isRunning AND NOT x.errorFail AND x.latestHeartbeat > %s THEN 1 ELSE 0 END) AS runs_running,
+   SUM(CASE WHEN x.isFinished AND NOT x.errorFail THEN 1 ELSE 0 END) AS runs_done
 FROM eas_task t
 INNER JOIN eas_task_types ett on t.taskTypeId = ett.taskTypeId
-WHERE t.taskId=%s;
-""".format(min_heartbeat=threshold_heartbeat_time), (node,))
+LEFT JOIN eas_scheduling_attempt x on x.taskId = t.taskId
+WHERE t.taskId=%s
+GROUP BY t.taskId, t.jobName, ett.taskTypeName, t.parentTask;
+""", (threshold_heartbeat_time, threshold_heartbeat_time, node))
                 item = task_db.db_handle.fetchall()[0]
 
                 new_tree = {
@@ -96,10 +95,10 @@ WHERE t.taskId=%s;
                     'job_name': item['jobName'] if item['jobName'] is not None else "<untitled>",
                     'task_type_name': item['taskTypeName'],
                     'task_id': item['taskId'],
-                    'w': item['runs_queued'],
-                    'r': item['runs_running'],
-                    's': item['runs_stalled'],
-                    'd': item['runs_done'],
+                    'w': int(item['runs_queued']),
+                    'r': int(item['runs_running']),
+                    's': int(item['runs_stalled']),
+                    'd': int(item['runs_done']),
                     'tree_truncated': False,
                     'children': [tree]
                 }
@@ -150,65 +149,64 @@ def fetch_job_tree(job_name: Optional[str] = None,
     # Fetch EAS pipeline settings
     s = settings.Settings()
 
-    def search_children(parent_id: int = None, depth: int = 0):
+    # The latest recorded heartbeat time at which a process is judged to be still running
+    threshold_heartbeat_time = time.time() - s.installation_info['max_heartbeat_age']
+
+    # Fetch the entire task tree in a single query, rather than querying the children of each task in turn
+    with task_database.TaskDatabaseConnection() as task_db:
+        task_db.db_handle.parameterised_query("""
+SELECT t.taskId, t.parentTask, t.jobName, ett.taskTypeName,
+   SUM(CASE WHEN x.isQueued THEN 1 ELSE 0 END) AS runs_queued,
+   SUM(CASE WHEN x.errorFail OR (x.isRunning AND x.latestHeartbeat < %s) THEN 1 ELSE 0 END) AS runs_stalled,
+   SUM(CASE WHEN x.isRunning AND NOT x.errorFail AND x.latestHeartbeat > %s THEN 1 ELSE 0 END) AS runs_running,
+   SUM(CASE WHEN x.isFinished AND NOT x.errorFail THEN 1 ELSE 0 END) AS runs_done
+FROM eas_task t
+INNER JOIN eas_task_types ett on t.taskTypeId = ett.taskTypeId
+LEFT JOIN eas_scheduling_attempt x on x.taskId = t.taskId
+GROUP BY t.taskId, t.parentTask, t.jobName, ett.taskTypeName
+ORDER BY t.taskId;
+""", (threshold_heartbeat_time, threshold_heartbeat_time))
+
+        task_list = task_db.db_handle.fetchall()
+
+    # Index tasks by ID, and build lists of the children of each task (in order of task ID)
+    task_by_id = {}
+    children_by_parent_id = {}
+    for item in task_list:
+        task_by_id[item['taskId']] = item
+        children_by_parent_id.setdefault(item['parentTask'], []).append(item)
+
+    # Select the tasks at the top of the tree
+    if parent_id is not None:
+        top_level_tasks = children_by_parent_id.get(parent_id, [])
+    elif job_name is None:
+        top_level_tasks = children_by_parent_id.get(None, [])
+    else:
+        # Tasks with the requested job name, whose parents do not have that job name
+        top_level_tasks = [item for item in task_list
+                           if item['jobName'] == job_name and
+                           (item['parentTask'] not in task_by_id or
+                            task_by_id[item['parentTask']]['jobName'] != job_name)]
+
+    def search_children(child_tasks: list, depth: int = 0):
         """
-        Search for child tasks of a parent.
+        Add a list of child tasks to the output, together with their own child tasks.
 
-        :param parent_id:
-            Search for tasks with a given parent.
+        :param child_tasks:
+            List of the tasks with a given parent.
         :param depth:
             Iteratively keep track of the depth within the hierarchy.
         :return:
             Boolean indicating whether the task tree has been truncated
         """
-        # Build an SQL query for all tasks with the selected parent
-        if parent_id is not None:
-            constraint = "parentTask = %s"
-            arguments = (parent_id,)
-        else:
-            if job_name is None:
-                constraint = "parentTask IS NULL"
-                arguments = ()
-            else:
-                constraint = """
-jobName = %s AND NOT EXISTS (SELECT 1 FROM eas_task p WHERE p.jobName=%s AND p.taskId=t.parentTask)
-"""
-                arguments = (job_name, job_name)
-
-        # The latest recorded heartbeat time at which a process is judged to be still running
-        threshold_heartbeat_time = time.time() - s.installation_info['max_heartbeat_age']
 
         # Do not exceed maximum requested depth
         if max_depth is not None and depth >= max_depth:
             # Check if tree is being truncated
-            task_db.db_handle.parameterised_query("""
-SELECT COUNT(t.taskId) AS count
-FROM eas_task t
-WHERE {constraint} ORDER BY taskId;
-""".format(constraint=constraint), arguments)
-
-            task_count = task_db.db_handle.fetchall()[0]['count']
-            return task_count > 0
-
-        # Search for all tasks with a given parent
-        task_db.db_handle.parameterised_query("""
-SELECT t.taskId, t.jobName, ett.taskTypeName,
-   (SELECT COUNT(*) FROM eas_scheduling_attempt x WHERE x.taskId = t.taskId AND x.isQueued) AS runs_queued,
-   (SELECT COUNT(*) FROM eas_scheduling_attempt x WHERE x.taskId = t.taskId AND
-                    (x.errorFail OR (x.isRunning AND x.latestHeartbeat < {min_heartbeat:f}))) AS runs_stalled,
-   (SELECT COUNT(*) FROM eas_scheduling_attempt x WHERE x.taskId = t.taskId AND
-                    x.isRunning AND NOT x.errorFail AND x.latestHeartbeat > {min_heartbeat:f}) AS runs_running,
-   (SELECT COUNT(*) FROM eas_scheduling_attempt x WHERE x.taskId = t.taskId AND
-                    x.isFinished AND NOT x.errorFail) AS runs_done
-FROM eas_task t
-INNER JOIN eas_task_types ett on t.taskTypeId = ett.taskTypeId
-WHERE {constraint} ORDER BY taskId;
-""".format(constraint=constraint, min_heartbeat=threshold_heartbeat_time), arguments)
-
-        task_list = task_db.db_handle.fetchall()
+            return len(child_tasks) > 0
 
         # Display each task in turn, complete with subtasks
-        for item in task_list:
+        for item in child_tasks:
             # Work out whether this task meets the user's chosen search criteria
             display_now = True
             if job_name is not None:
@@ -223,16 +221,16 @@ WHERE {constraint} ORDER BY taskId;
                     'job_name': item['jobName'] if item['jobName'] is not None else "<untitled>",
                     'task_type_name': item['taskTypeName'],
                     'task_id': item['taskId'],
-                    'w': item['runs_queued'],
-                    'r': item['runs_running'],
-                    's': item['runs_stalled'],
-                    'd': item['runs_done'],
+                    'w': int(item['runs_queued']),
+                    'r': int(item['runs_running']),
+                    's': int(item['runs_stalled']),
+                    'd': int(item['runs_done']),
                     'tree_truncated': False
                 }
                 output.append(item_info)
 
             # Search for child tasks
-            truncated = search_children(parent_id=item['taskId'], depth=depth + 1)
+            truncated = search_children(child_tasks=children_by_parent_id.get(item['taskId'], []), depth=depth + 1)
             if truncated:
                 item_info['tree_truncated'] = True
 
@@ -240,8 +238,7 @@ WHERE {constraint} ORDER BY taskId;
         return False
 
     # Fetch job tree
-    with task_database.TaskDatabaseConnection() as task_db:
-        search_children(parent_id=parent_id)
+    search_children(child_tasks=top_level_tasks)
 
     # Return lines of output
     return output
@@ -285,9 +285,21 @@ class LightcurveArbitraryRaster(Lightcurve):
         flags = []
 
         if binary:
-            # Read binary lightcurve file
-            time, flux, flag, uncertainties = np.load(file_path)
-            time /= 86400  # Times stored in seconds; but Lightcurve objects use days
+            # Memory-map binary lightcurve file, so that rows beyond the cut-off time are never read from disk
+            data = np.load(file_path, mmap_mode='r')
+
+            # Find the last row before the cut-off time by bisection (lightcurves are stored in time order)
+            end = len(data)
+            if cut_off_time is not None:
+                end = np.searchsorted(data[:, 0], cut_off_time * 86400, side='right')
+
+            # Copy each column of the rows we need into its own array, so that the lightcurve does not keep the file
+            # mapped, and can be modified in place
+            times = np.array(data[:end, 0])
+            times /= 86400  # Times stored in seconds; but Lightcurve objects use days
+            fluxes = np.array(data[:end, 1])
+            flags = np.array(data[:end, 2])
+            uncertainties = np.array(data[:end, 3])
         else:
             # Textual lightcurve: loop over lines of input file
             if gzipped:
@@ -450,17 +462,18 @@ class LightcurveArbitraryRaster(Lightcurve):
         :param maximum_time:
             The highest time value for which flux points should be included [days]
         :return:
-            A new Lightcurve object.
+            A new Lightcurve object, whose arrays are views onto those of this lightcurve.
         """
 
+        # Times are in ascending order, so the points we want form a contiguous slice, which we find by bisection
         times = self.get_times()
-        mask = (times >= minimum_time) * (times < maximum_time)
+        start, end = np.searchsorted(times, [minimum_time, maximum_time], side='left')
 
         return LightcurveArbitraryRaster(
-            times=times[mask],
-            fluxes=self.get_fluxes()[mask],
-            uncertainties=self.get_uncertainties()[mask],
-            flags=self.get_flags()[mask],
+            times=times[start:end],
+            fluxes=self.get_fluxes()[start:end],
+            uncertainties=self.get_uncertainties()[start:end],
+            flags=self.get_flags()[start:end],
             metadata=self.metadata
         )
 
@@ -537,6 +550,16 @@ class LightcurveArbitraryRaster(Lightcurve):
         start_time = self.times[0]
         end_time = self.times[-1]
         times = np.arange(start=start_time, stop=end_time, step=spacing)
+
+        # If the input lightcurve is already sampled on the required raster, with no gaps, then we can skip the search
+        # for missing points below, which is slow
+        if len(self.times) >= len(times) and np.all(np.abs(self.times[:len(times)] - times) <= abs_tol):
+            return LightcurveFixedStep(
+                time_start=start_time,
+                time_step=spacing,
+                fluxes=self.fluxes[:len(times)].copy()
+            )
+
         output = np.zeros_like(times)
         error_count = 0
 
@@ -9,6 +9,9 @@ import numpy as np
 
 from plato_wp36.lightcurve import LightcurveArbitraryRaster
 
+# Metadata keys which are propagated from the input lightcurve to the results of every transit-detection task
+propagated_metadata_keys = ('integrated_transit_power', 'pixels_in_transit', 'mes')
+
 
 def transit_detection_quality_control(lc: LightcurveArbitraryRaster, metadata: dict):
     """
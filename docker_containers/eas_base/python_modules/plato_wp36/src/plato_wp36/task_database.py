@@ -13,7 +13,7 @@ import re
 import shutil
 import time
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from .connect_db import DatabaseConnector
 from .settings import Settings
@@ -109,25 +109,22 @@ FROM eas_worker_containers ORDER BY containerId;""")
             }
             output.container_capabilities[item['containerName']] = set()
 
-        # Fetch list of task types
+        # Fetch list of task types, together with the containers which can run each one, in a single query
         self.db_handle.parameterised_query("""
-SELECT taskTypeId, taskTypeName
-FROM eas_task_types ORDER BY taskTypeId;""")
+SELECT ty.taskTypeName, c.containerName
+FROM eas_task_types ty
+LEFT JOIN eas_task_containers x ON x.taskTypeId = ty.taskTypeId
+LEFT JOIN eas_worker_containers c ON c.containerId = x.containerId
+ORDER BY ty.taskTypeId, c.containerId;""")
 
-        # Iterate over each type of task
+        # Iterate over each pairing of a task type with a container which can run it
         for item in self.db_handle.fetchall():
-            # Fetch list of containers which can run this task
-            self.db_handle.parameterised_query("""
-SELECT c.containerName
-FROM eas_task_containers x
-INNER JOIN eas_worker_containers c ON c.containerId = x.containerId
-WHERE x.taskTypeId=%s
-ORDER BY c.containerId;""", (item['taskTypeId'],))
-            container_list = set([i['containerName'] for i in self.db_handle.fetchall()])
-            output.task_list[item['taskTypeName']] = container_list
+            container_list = output.task_list.setdefault(item['taskTypeName'], set())
 
-            for container_name in container_list:
-                output.container_capabilities[container_name].add(item['taskTypeName'])
+            # Task types which no container can run have a single row, with a NULL container
+            if item['containerName'] is not None:
+                container_list.add(item['containerName'])
+                output.container_capabilities[item['containerName']].add(item['taskTypeName'])
 
         # Return list
         return output
@@ -329,6 +326,57 @@ WHERE {};""".format(" AND ".join(constraints)))
         # Return dictionary of <MetadataItem>s
         return output
 
+    def metadata_fetch_all_multiple(self,
+                                    task_ids: Optional[List[int]] = None,
+                                    scheduling_attempt_ids: Optional[List[int]] = None):
+        """
+        Fetch dictionaries of metadata objects associated with many entities in the database, using one query per
+        batch of entities rather than one query per entity. Specify *either* a list of tasks, *or* a list of
+        execution attempts.
+
+        :param task_ids:
+            Fetch metadata associated with each of a list of tasks.
+        :param scheduling_attempt_ids:
+            Fetch metadata associated with each of a list of task execution attempts.
+        :return:
+            Dictionary of dictionaries of MetadataItem objects, indexed by entity ID
+        """
+
+        # Work out which entities we are fetching metadata for
+        if task_ids is not None:
+            id_field = "taskId"
+            entity_ids = [int(item) for item in task_ids]
+        else:
+            assert scheduling_attempt_ids is not None
+            id_field = "schedulingAttemptId"
+            entity_ids = [int(item) for item in scheduling_attempt_ids]
+
+        # Create an empty dictionary of metadata for each entity
+        output = {entity_id: {} for entity_id in entity_ids}
+
+        # Fetch metadata in batches, to keep within the database's limit on the number of query parameters
+        batch_size = 500
+        for batch_start in range(0, len(entity_ids), batch_size):
+            batch = entity_ids[batch_start:batch_start + batch_size]
+            placeholders = ",".join(["%s"] * len(batch))
+            self.db_handle.parameterised_query("""
+SELECT m.{id_field} AS entityId, k.name AS keyword, m.valueFloat, m.valueString, m.setAtTime
+FROM eas_metadata_item m
+INNER JOIN eas_metadata_keys k ON k.keyId=m.metadataKey
+WHERE m.{id_field} IN ({placeholders});""".format(id_field=id_field, placeholders=placeholders), tuple(batch))
+
+            for item in self.db_handle.fetchall():
+                value = None
+                for value_field in ('valueString', 'valueFloat'):
+                    if item[value_field] is not None:
+                        value = item[value_field]
+                output[item['entityId']][item['keyword']] = MetadataItem(keyword=item['keyword'],
+                                                                         value=value,
+                                                                         timestamp=item['setAtTime'])
+
+        # Return dictionary of dictionaries of <MetadataItem>s
+        return output
+
     def metadata_fetch_item(self, keyword: str,
                             task_id: Optional[int] = None,
                             scheduling_attempt_id: Optional[int] = None,
@@ -819,6 +867,28 @@ UPDATE eas_product_version SET passedQc=%s WHERE productVersionId=%s;
         if metadata is not None:
             self.metadata_register(product_version_id=product_version_id, metadata=metadata)
 
+    def file_versions_update_qc(self, product_version_ids: List[int], passed_qc: bool):
+        """
+        Update the QC status of many file product versions in a single database query.
+
+        :param product_version_ids:
+            List of the ID integers of the file product versions to update.
+        :param passed_qc:
+            Boolean indicating whether QC checks have taken place on these files, and whether they passed
+        :return:
+            None
+        """
+
+        # Nothing to do if there are no file product versions
+        if len(product_version_ids) == 0:
+            return
+
+        # Update all file product versions at once
+        placeholders = ",".join(["%s"] * len(product_version_ids))
+        self.db_handle.parameterised_query("""
+UPDATE eas_product_version SET passedQc=%s WHERE productVersionId IN ({});
+""".format(placeholders), (passed_qc, *product_version_ids))
+
     # *** Functions relating to intermediate file products
     def file_product_exists_in_db(self, product_id: int):
         """
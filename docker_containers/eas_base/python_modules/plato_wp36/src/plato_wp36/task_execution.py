@@ -15,6 +15,7 @@ import logging
 import os
 import sys
 import subprocess
+import tempfile
 import traceback
 
 from typing import Callable, Iterable, Optional
@@ -23,7 +24,7 @@ from plato_wp36 import logging_database, task_database, task_expression_evaluati
 from plato_wp36 import task_heartbeat, task_objects, task_timer
 
 
-def call_subprocess_and_log_output(arguments: Iterable, shell: Optional[bool] = None):
+def call_subprocess_and_log_output(arguments: Iterable, shell: Optional[bool] = None, cwd: Optional[str] = None):
     """
     Execute a shell command, and capture any error messages sent to stderr, storing them in the logging database.
     
@@ -31,12 +32,14 @@ def call_subprocess_and_log_output(arguments: Iterable, shell: Optional[bool] =
         A list of the command-line arguments to run in the shell.
     :param shell:
         Boolean indicating whether subprocess runs in a shell.
+    :param cwd:
+        The working directory in which to run the subprocess. If None, use our current working directory.
     :return:
         Boolean indicating whether the process exited with no error reported
     """
 
     # Run subprocess
-    proc = call_subprocess_and_catch_stdout(arguments=arguments, shell=shell)
+    proc = call_subprocess_and_catch_stdout(arguments=arguments, shell=shell, cwd=cwd)
 
     # If process produced any output to stdout, send that to the terminal now
     stdout = proc[1].decode('utf-8').strip()
@@ -47,7 +50,7 @@ def call_subprocess_and_log_output(arguments: Iterable, shell: Optional[bool] =
     return proc[0]
 
 
-def call_subprocess_and_catch_stdout(arguments: Iterable, shell: Optional[bool] = None):
+def call_subprocess_and_catch_stdout(arguments: Iterable, shell: Optional[bool] = None, cwd: Optional[str] = None):
     """
     Execute a shell command, and capture any error messages sent to stderr, storing them in the logging database.
 
@@ -55,13 +58,15 @@ def call_subprocess_and_catch_stdout(arguments: Iterable, shell: Optional[bool]
         A list of the command-line arguments to run in the shell.
     :param shell:
         Boolean indicating whether subprocess runs in a shell.
+    :param cwd:
+        The working directory in which to run the subprocess. If None, use our current working directory.
     :return:
         Boolean indicating whether the process exited with no error reported
     """
 
     # Run subprocess
     string_arguments = [str(item) for item in arguments]
-    process_output = subprocess.run(string_arguments, capture_output=True, shell=shell)
+    process_output = subprocess.run(string_arguments, capture_output=True, shell=shell, cwd=cwd)
 
     # Check if subprocess exited with non-zero status, and log it
     if process_output.returncode != 0:
@@ -76,6 +81,42 @@ def call_subprocess_and_catch_stdout(arguments: Iterable, shell: Optional[bool]
     return process_output.returncode == 0, process_output.stdout
 
 
+def call_subprocess_and_iterate_stdout(arguments: Iterable, shell: Optional[bool] = None):
+    """
+    Execute a shell command, and yield each line that it sends to stdout as soon as it is produced, rather than
+    buffering the whole output in memory. Any error messages sent to stderr are stored in the logging database.
+
+    :param arguments:
+        A list of the command-line arguments to run in the shell.
+    :param shell:
+        Boolean indicating whether subprocess runs in a shell.
+    :return:
+        Iterator over the lines of text the process sends to stdout. Raises <subprocess.CalledProcessError> once
+        the output is exhausted if the process exited with an error.
+    """
+
+    # Run subprocess. Send stderr to a temporary file, so the process can never block on a full stderr pipe while
+    # we are reading its stdout.
+    string_arguments = [str(item) for item in arguments]
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(string_arguments, stdout=subprocess.PIPE, stderr=stderr_file,
+                              shell=shell, text=True) as process:
+            for line in process.stdout:
+                yield line
+        return_code = process.wait()
+
+        # Check if subprocess produced any output on stderr
+        stderr_file.seek(0)
+        stderr_string = stderr_file.read().decode('utf-8').strip()
+        if len(stderr_string) > 0:
+            logging.warning("Executed subprocess produced stderr output:\n{:s}".format(stderr_string))
+
+    # Check if subprocess exited with non-zero status, and log it
+    if return_code != 0:
+        logging.error("Executed subprocess returned error code {:d}".format(return_code))
+        raise subprocess.CalledProcessError(returncode=return_code, cmd=string_arguments)
+
+
 def eas_pipeline_task(
         task_handler: Callable[[task_database.TaskExecutionAttempt], None],
 
@@ -10,13 +10,66 @@ import os
 import shutil
 import time
 
+from typing import Optional
+
+# The path to a RAM-backed filesystem, which we can use for temporary files that are accessed many times
+shared_memory_path = "/dev/shm"
+
+# The amount of free space, in bytes, that we leave on the RAM-backed filesystem over and above the expected size
+# of the files we store there
+shared_memory_headroom = 8 * 1024 * 1024
+
+
+def shared_memory_available(required_bytes: int = 0):
+    """
+    Test whether the RAM-backed filesystem exists, and has enough free space to store some files.
+
+    :param required_bytes:
+        The expected total size of the files to be stored, in bytes.
+    :return:
+        Boolean indicating whether the files may be stored on the RAM-backed filesystem.
+    """
+
+    # Check that the RAM-backed filesystem exists
+    if not os.path.isdir(shared_memory_path):
+        return False
+
+    # Check that it has enough free space, leaving some headroom for other processes
+    try:
+        free_bytes = shutil.disk_usage(shared_memory_path).free
+    except OSError:
+        return False
+    return free_bytes >= required_bytes + shared_memory_headroom
+
 
 class TemporaryDirectory:
     """
     Class to create a temporary working directory, and clean up its contents afterwards
     """
 
-    def __init__(self):
+    def __init__(self, parent_directory: Optional[str] = None, in_memory: bool = False,
+                 required_bytes: int = 0):
+        """
+        Create a temporary working directory.
+
+        :param parent_directory:
+            The directory in which to create the temporary directory. Defaults to </tmp>.
+        :param in_memory:
+            If True, and no parent directory is specified, create the temporary directory on a RAM-backed filesystem
+            (</dev/shm>) if one is available. This should only be used for small files which are accessed many times,
+            since Docker containers only have 64 MB of </dev/shm> by default.
+        :param required_bytes:
+            The expected total size of the files to be stored in an in-memory temporary directory. If </dev/shm> does
+            not have this much free space, plus some headroom, the temporary directory is created in </tmp> instead.
+        """
+
+        # Use default parent directory if none was specified
+        if parent_directory is None:
+            if in_memory and shared_memory_available(required_bytes=required_bytes):
+                parent_directory = shared_memory_path
+            else:
+                parent_directory = "/tmp"
+
         # Create a random hex id to use in the filename of the temporary directory
         key_string = str(time.time())
         uid = hashlib.md5(key_string.encode()).hexdigest()
@@ -24,7 +77,7 @@ class TemporaryDirectory:
         # Create temporary working directory
         identifier = uid[:32]
         id_string = "eas_{:d}_{}".format(os.getpid(), identifier)
-        tmp_dir = os.path.join("/tmp", id_string)
+        tmp_dir = os.path.join(parent_directory, id_string)
         os.makedirs(name=tmp_dir, mode=0o700, exist_ok=True)
 
         self.tmp_dir = tmp_dir
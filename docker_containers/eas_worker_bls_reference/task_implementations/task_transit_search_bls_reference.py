@@ -58,8 +58,8 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
     qc_metadata = quality_control.transit_detection_quality_control(lc=lc_in, metadata=bls_output)
 
     # Propagate some metadata from input lightcurve to transit-detection results
-    for item in ['integrated_transit_power', 'pixels_in_transit', 'pixels_in_transit', 'mes']:
-        bls_output[item] = lc_in.metadata.get(item, None)
+    bls_output.update({item: lc_in.metadata.get(item, None)
+                       for item in quality_control.propagated_metadata_keys})
 
     # Open a connection to the task database
     with task_database.TaskDatabaseConnection() as task_db:
@@ -42,10 +42,10 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
                 tmp_dir=tmp_dir,
                 input_name="lightcurve"
             )
-        lc_in = lightcurve.LightcurveArbitraryRaster.from_file(
-            file_path=lc_in_filename,
-            file_metadata=lc_in_metadata
-        )
+            lc_in = lightcurve.LightcurveArbitraryRaster.from_file(
+                file_path=lc_in_filename,
+                file_metadata=lc_in_metadata
+            )
 
     # Process lightcurve
     search_settings = execution_attempt.task_object.task_description.get('search_settings', {})
@@ -58,8 +58,8 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
     qc_metadata = quality_control.transit_detection_quality_control(lc=lc_in, metadata=dst_output)
 
     # Propagate some metadata from input lightcurve to transit-detection results
-    for item in ['integrated_transit_power', 'pixels_in_transit', 'pixels_in_transit', 'mes']:
-        dst_output[item] = lc_in.metadata.get(item, None)
+    dst_output.update({item: lc_in.metadata.get(item, None)
+                       for item in quality_control.propagated_metadata_keys})
 
     # Open a connection to the task database
     with task_database.TaskDatabaseConnection() as task_db:
@@ -34,20 +34,22 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
         directory=directory, filename=filename_in, lc_days=lc_duration)
     )
 
-    # Read input lightcurve
-    with temporary_directory.TemporaryDirectory() as tmp_dir:
-        with task_database.TaskDatabaseConnection() as task_db:
+    # Open a connection to the task database, which we use to read the input
+    with task_database.TaskDatabaseConnection() as task_db:
+        # Read input lightcurve
+        with temporary_directory.TemporaryDirectory() as tmp_dir:
             lc_in_filename, lc_in_metadata = task_db.task_open_file_input(
                 task=execution_attempt.task_object,
                 tmp_dir=tmp_dir,
                 input_name="lightcurve"
             )
-        lc_in = lightcurve.LightcurveArbitraryRaster.from_file(
-            file_path=lc_in_filename,
-            file_metadata=lc_in_metadata
-        )
+            lc_in = lightcurve.LightcurveArbitraryRaster.from_file(
+                file_path=lc_in_filename,
+                file_metadata=lc_in_metadata
+            )
 
-    # Process lightcurve
+    # Process lightcurve. The database connection is closed while we do this, since the search may take a long time,
+    # and an idle connection would hold a transaction open and may be timed out by the server.
     search_settings = execution_attempt.task_object.task_description.get('search_settings', {})
     x = exotrans.process_lightcurve(lc=lc_in, lc_duration=lc_duration, search_settings=search_settings)
 
@@ -58,12 +60,11 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
     qc_metadata = quality_control.transit_detection_quality_control(lc=lc_in, metadata=exotrans_output)
 
     # Propagate some metadata from input lightcurve to transit-detection results
-    for item in ['integrated_transit_power', 'pixels_in_transit', 'pixels_in_transit', 'mes']:
-        exotrans_output[item] = lc_in.metadata.get(item, None)
+    exotrans_output.update({item: lc_in.metadata.get(item, None)
+                            for item in quality_control.propagated_metadata_keys})
 
-    # Open a connection to the task database
+    # Reconnect to the task database to log outcome metadata
     with task_database.TaskDatabaseConnection() as task_db:
-        # Log outcome metadata to the database
         task_db.execution_attempt_update(attempt_id=execution_attempt.attempt_id,
                                          metadata={**exotrans_output, **qc_metadata})
 
@@ -5,71 +5,170 @@ import glob
 import logging
 import numpy as np
 import os
-import dask
+import subprocess
+import tarfile
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from math import floor, log, sqrt
-from multiprocessing.pool import ThreadPool
-from typing import Dict, Optional
+from typing import Iterable, Optional, TextIO
 
 from plato_wp36.lightcurve import LightcurveArbitraryRaster
 from plato_wp36 import settings, task_database, task_execution, temporary_directory
 
-# Keep track of the S and M values returned each time we run QATS
-# Storing these as global variables is not thread-safe, but unfortunately is the only way to make them
-# accessible to many dask threads working on the same call to <process_lightcurve>. This is fine so
-# long as the calling process doesn't make multiple parallel calls to <process_lightcurve>.
-qats_output: Dict[str, Dict[str, float]] = {}
-s_maximum: float = 0.
-s_maximum_index: Optional[str] = None
+# Path where we store a tarball of debugging files, if the task declares a <debugging> output
+debugging_tarball = "/tmp/qats_debugging.tar.gz"
 
+# The columns of the structured array in which we collate the results of running QATS at each grid point
+qats_output_dtype = np.dtype([
+    ('s_best', np.float64),  # Signal strength of best-fit transit sequence
+    ('m_best', np.int32),  # Number of transits in best-fit sequence
+    ('delta_min', np.int64),  # Minimum spacing between transits (time steps)
+    ('delta_max', np.int64),  # Maximum spacing between transits (time steps)
+    ('transit_length', np.float64)  # Length of transits (time steps)
+])
 
-@dask.delayed
-def dask_thread(qats_path, lc_file, delta_min, delta_max, transit_length):
-    global qats_output, s_maximum, s_maximum_index
 
-    run_key = "{}_{}_{}".format(delta_min, delta_max, transit_length)
+@lru_cache(maxsize=1)
+def get_thread_count():
+    """
+    Look up how many CPU cores are assigned to each QATS worker container. The result is cached, so that we only
+    query the task database once per process, however many lightcurves we process.
+
+    :return:
+        The number of threads to use when running QATS
+    """
+    with task_database.TaskDatabaseConnection() as task_db:
+        qats_thread_assigned = task_db.container_get_resource_assignment(container_name='eas_worker_qats')['cpu']
+    return max(1, int(qats_thread_assigned))
+
+
+def normalise_fluxes(fluxes: np.ndarray):
+    """
+    Subtract the median from an array of fluxes, and divide by the standard deviation, in place.
+
+    The standard deviation is computed from a single dot product and sum over the median-subtracted fluxes,
+    which avoids the temporary arrays that <np.std> allocates.
+
+    :param fluxes:
+        The array of fluxes to normalise. This is modified in place.
+    :return:
+        None
+    """
+
+    # Median subtract lightcurve
+    fluxes -= np.median(fluxes)
+
+    # Normalise lightcurve
+    n = fluxes.size
+    mean = np.sum(fluxes) / n
+    variance = np.dot(fluxes, fluxes) / n - mean * mean
+    if variance > 0:
+        fluxes *= 1. / sqrt(variance)
+
+
+def copy_lines_to_file(lines: Iterable[str], file: TextIO):
+    """
+    Pass through an iterable over lines of text, writing a copy of each line to a file as it goes by.
+
+    :param lines:
+        The lines of text to pass through.
+    :param file:
+        The file handle to write a copy of the lines to.
+    :return:
+        Iterator over the input lines of text.
+    """
+    for line in lines:
+        file.write(line)
+        yield line
+
+
+def debugging_enabled(task_description: dict):
+    """
+    Work out whether a tarball of debugging files should be produced. We produce one only if the task declares a
+    <debugging> output file to store it in.
+
+    :param task_description:
+        The description of the task we are to perform.
+    :return:
+        Boolean flag indicating whether debugging output is enabled.
+    """
+    return 'debugging' in task_description.get('outputs', {})
+
+
+def parse_qats_output(qats_stdout: Iterable[str]):
+    """
+    Parse the two-column numerical output produced by the QATS binaries into a numpy array. Comment lines, and any
+    malformed lines which do not contain exactly two numbers, are skipped.
+
+    :param qats_stdout:
+        The raw output that a QATS binary sent to stdout, as an iterable over lines of text (which may be consumed
+        while the QATS process is still running).
+    :return:
+        A two-dimensional numpy array, with one row for each valid line of output.
+    """
+    values = []
+    for line in qats_stdout:
+        # Ignore blank lines, comment lines, and lines which do not contain two columns
+        words = line.split()
+        if len(words) != 2 or words[0].startswith('#'):
+            continue
+
+        # Skip lines which are not numerical
+        try:
+            values.append((float(words[0]), float(words[1])))
+        except ValueError:
+            logging.warning("Could not parse QATS output line <{}>".format(line.strip()))
+
+    return np.array(values, dtype=float).reshape(-1, 2)
+
+
+def run_qats(qats_path: str, lc_file: str, delta_min: int, delta_max: int, transit_length: float):
+    """
+    Run QATS on a single point in the grid of (delta_min, delta_max, transit_length), and parse its output.
+
+    This function does not touch any shared state, so it is safe to call from many worker threads at once.
+
+    :param qats_path:
+        The path to the QATS binary <call_qats>.
+    :param lc_file:
+        The path to the text file containing the lightcurve to be searched.
+    :param delta_min:
+        The minimum spacing between transits to consider (time steps).
+    :param delta_max:
+        The maximum spacing between transits to consider (time steps).
+    :param transit_length:
+        The length of the transits to search for (time steps).
+    :return:
+        Tuple of (s_best, m_best) describing the best-fit sequence of transits, or None if QATS returned no result.
+    """
 
     # logging.info("{} {} {} {} {}".format(qats_path, lc_file, delta_min, delta_max, transit_length))
 
-    qats_ok, qats_stdout = task_execution.call_subprocess_and_catch_stdout(
-        arguments=(qats_path, lc_file, delta_min, delta_max, transit_length)
-    )
-
-    if qats_ok:
-        # QATS returned no error
-        # Loop over lines of output and read S_best and M_best
-        for line in qats_stdout.decode('utf-8').split('\n'):
-            line = line.strip()
-            # Ignore comment lines
-            if (len(line) < 1) or (line[0] == '#'):
-                continue
-
-            # Split line into words
-            words = line.split()
-            if len(words) == 2:
-                try:
-                    s_best = float(words[0])  # Signal strength of best-fit transit sequence
-                    m_best = int(words[1])  # Number of transits in best-fit sequence
-
-                    # The QATS paper is ambiguous whether this is required
-                    # s_best /= sqrt(m_best * transit_length)
-
-                    qats_output[run_key] = {
-                        's_best': s_best,
-                        'm_best': m_best,
-                        'delta_min': delta_min,
-                        'delta_max': delta_max,
-                        'transit_length': transit_length
-                    }
-
-                    if s_best > s_maximum:
-                        s_maximum = s_best
-                        s_maximum_index = run_key
-                except ValueError:
-                    logging.warning("Could not parse QATS output")
-
-
-def process_lightcurve(lc: LightcurveArbitraryRaster, lc_duration: Optional[float], search_settings: dict):
+    # Run QATS, and read S_best and M_best from its output as it is produced
+    try:
+        qats_values = parse_qats_output(qats_stdout=task_execution.call_subprocess_and_iterate_stdout(
+            arguments=(qats_path, lc_file, delta_min, delta_max, transit_length)
+        ))
+    except subprocess.CalledProcessError:
+        return None
+
+    # QATS returned no error
+    if qats_values.size == 0:
+        return None
+
+    s_best = float(qats_values[-1, 0])  # Signal strength of best-fit transit sequence
+    m_best = int(qats_values[-1, 1])  # Number of transits in best-fit sequence
+
+    # The QATS paper is ambiguous whether this is required
+    # s_best /= sqrt(m_best * transit_length)
+
+    return s_best, m_best
+
+
+def process_lightcurve(lc: LightcurveArbitraryRaster, lc_duration: Optional[float], search_settings: dict,
+                       debug: bool = False):
     """
     Perform a transit search on a light curve, using the QATS code.
 
@@ -87,20 +186,16 @@ def process_lightcurve(lc: LightcurveArbitraryRaster, lc_duration: Optional[floa
         Dictionary of settings which control how we search for transits.
     :type search_settings:
         dict
+    :param debug:
+        Boolean flag indicating whether to produce a tarball of debugging files, at <debugging_tarball>.
+    :type debug:
+        bool
     :return:
         dict containing the results of the transit search.
     """
 
-    # Reset global variables
-    global qats_output, s_maximum, s_maximum_index
-    qats_output = {}
-    s_maximum = 0.
-    s_maximum_index = None
-
-    # Fetch EAS pipeline settings to find out how many threads are allocated to each TLS worker
-    with task_database.TaskDatabaseConnection() as task_db:
-        qats_thread_assigned = task_db.container_get_resource_assignment(container_name='eas_worker_qats')['cpu']
-        qats_thread_count = max(1, int(qats_thread_assigned))
+    # Fetch EAS pipeline settings to find out how many threads are allocated to each QATS worker
+    qats_thread_count = get_thread_count()
     logging.info("QATS using {:d} threads".format(qats_thread_count))
 
     # If requested, truncate the input lightcurve before we start processing it
@@ -113,13 +208,8 @@ def process_lightcurve(lc: LightcurveArbitraryRaster, lc_duration: Optional[floa
     # Convert input lightcurve to a fixed time step, and fill in gaps
     lc_fixed_step = lc.to_fixed_step()
 
-    # Median subtract lightcurve
-    median = np.median(lc_fixed_step.fluxes)
-    lc_fixed_step.fluxes -= median
-
-    # Normalise lightcurve
-    std_dev = np.std(lc_fixed_step.fluxes)
-    lc_fixed_step.fluxes /= std_dev
+    # Median subtract lightcurve, and normalise
+    normalise_fluxes(fluxes=lc_fixed_step.fluxes)
 
     # List of transit durations to consider
     lc_time_step_days = lc_fixed_step.time_step  # days
@@ -138,106 +228,122 @@ def process_lightcurve(lc: LightcurveArbitraryRaster, lc_duration: Optional[floa
 
     # Maximum TTV relative magnitude f
     max_ttv_mag = float(search_settings.get('max_ttv_mag', 0.0005))
-    delta_spans = int(floor(log(maximum_period / period_min) / log(1 + max_ttv_mag / 2)))
+    delta_ratio = 1 + max_ttv_mag / 2  # Ratio between the edges of successive spans in delta
+    delta_spans = int(floor(log(maximum_period / period_min) / log(delta_ratio)))
     delta_base = period_min / lc_time_step_days  # time steps
 
     # Logging
     logging.info("QATS testing {:d} transit lengths".format(len(durations)))
     logging.info("QATS testing {} delta spans".format(delta_spans))
 
-    # Path to the QATS binary
-    qats_path = os.path.join(eas_settings.settings['pythonPath'],
-                             "../../data/datadir_local/qats/qats/call_qats")
-
-    # Store lightcurve to a text file in a temporary directory
-    with temporary_directory.TemporaryDirectory() as tmp_dir:
+    # Paths to the QATS binaries. These are invariant, so resolve them once, outside the loops below.
+    python_path = eas_settings.settings['pythonPath']
+    qats_path = os.path.realpath(os.path.join(python_path, "../../data/datadir_local/qats/qats/call_qats"))
+    qats_indices_path = os.path.realpath(os.path.join(python_path,
+                                                      "../../data/datadir_local/qats/qats/call_qats_indices"))
+
+    # Store lightcurve to a text file in a temporary directory. Every QATS child process re-reads this file, so
+    # place it on a RAM-backed filesystem if one is available with enough free space. Each sample is written as a
+    # line of text of no more than 16 bytes.
+    lc_file_bytes = len(lc_fixed_step.fluxes) * 16
+    with temporary_directory.TemporaryDirectory(in_memory=True, required_bytes=lc_file_bytes) as tmp_dir:
         lc_file = os.path.join(tmp_dir.tmp_dir, "lc.dat")
 
-        # Store lightcurve to single-column text file without scientific notation
-        np.savetxt(lc_file, lc_fixed_step.fluxes, fmt='%f')
-
-        # Loop over all values of q
-        delayed_processes = []
-        for transit_length in durations:
-            for delta_index in range(0, delta_spans):
-                # Equation 15
-                delta_min = int(delta_base * pow(1 + max_ttv_mag / 2, delta_index))
-
-                # Equation 16
-                delta_max = int(delta_base * pow(1 + max_ttv_mag / 2, delta_index + 1))
-
-                # Ignore grid points with zero span in period
-                if delta_min == delta_max:
-                    continue
-
-                # Run QATS
-                delayed_processes.append(dask_thread(qats_path, lc_file, delta_min, delta_max, transit_length))
-
-        # Run delayed processes
-        dask.config.set(pool=ThreadPool(qats_thread_count))
-        dask.compute(delayed_processes)
-
-        # Produce output file with all the results
-        with open(os.path.join(tmp_dir.tmp_dir, "grid.qats"), "wt") as f:
-            ordered_rows = sorted(qats_output.values(), key=lambda x: x['s_best'], reverse=True)
-            for row in ordered_rows:
-                f.write("{s_best:15.5f} {m_best:5d} {delta_min:15.5f} {delta_max:15.5f} {transit_length:15.5f}\n".
-                        format(**row))
+        # Store lightcurve to single-column text file without scientific notation. Unlike <np.savetxt>, <tofile>
+        # formats the values in C, rather than calling Python string formatting once for every sample.
+        lc_fixed_step.fluxes.tofile(lc_file, sep='\n', format='%f')
+
+        # Edges of the spans in delta, which are the same for every value of q. Span <i> runs from delta_edges[i]
+        # (Equation 15) to delta_edges[i+1] (Equation 16).
+        delta_edges = np.floor(delta_base * np.power(delta_ratio, np.arange(delta_spans + 1)))
+        delta_edges = delta_edges.astype(np.int64)
+
+        # Ignore spans with zero width in period. These do not depend on q, so remove them before building the grid.
+        span_mask = np.diff(delta_edges) > 0
+        span_delta_min = delta_edges[:-1][span_mask]
+        span_delta_max = delta_edges[1:][span_mask]
+
+        # Build the full grid of (delta_min, delta_max, q) values to test
+        grid_transit_length, grid_span_index = np.meshgrid(durations, np.arange(len(span_delta_min)), indexing='ij')
+        grid_delta_min = span_delta_min[grid_span_index]
+        grid_delta_max = span_delta_max[grid_span_index]
+
+        # Run QATS over the whole grid in a single batch. Each worker thread simply waits on a QATS child process, so
+        # threads are sufficient to keep <qats_thread_count> cores busy.
+        with ThreadPoolExecutor(max_workers=qats_thread_count) as executor:
+            qats_results = list(executor.map(run_qats,
+                                             repeat(qats_path),
+                                             repeat(lc_file),
+                                             grid_delta_min.ravel().tolist(),
+                                             grid_delta_max.ravel().tolist(),
+                                             grid_transit_length.ravel().tolist()
+                                             ))
+
+        # Collate the results from all the worker threads into a structured array, with one row per grid point
+        qats_output = np.zeros(len(qats_results), dtype=qats_output_dtype)
+        qats_output['delta_min'] = grid_delta_min.ravel()
+        qats_output['delta_max'] = grid_delta_max.ravel()
+        qats_output['transit_length'] = grid_transit_length.ravel()
+        qats_output_valid = np.array([item is not None for item in qats_results], dtype=bool)
+        qats_output['s_best'] = [item[0] if item is not None else np.nan for item in qats_results]
+        qats_output['m_best'] = [item[1] if item is not None else 0 for item in qats_results]
+        qats_output = qats_output[qats_output_valid]
+
+        # Find the grid point which produced the strongest (positive) signal
+        best_fit = None
+        if len(qats_output) > 0:
+            best_index = int(np.argmax(qats_output['s_best']))
+            if qats_output['s_best'][best_index] > 0:
+                best_fit = qats_output[best_index]
+
+        # If debugging output is requested, produce a binary output file with the results from every grid point
+        if debug:
+            np.save(os.path.join(tmp_dir.tmp_dir, "grid.npy"), qats_output)
 
         # Now fetch the best-fit sequence of transits
         transit_list = []
-        if s_maximum_index is not None:
-            x = qats_output[s_maximum_index]
+        if best_fit is not None:
+            x = best_fit
 
             # Report results
             logging.info("Best fit: S={:.1f} ; M={:.0f}; transit length={:.2f} days".
-                         format(s_maximum, x['m_best'], x['transit_length'] * lc_time_step_days))
-
-            # Run QATS
-            qats_path = os.path.join(eas_settings.settings['pythonPath'],
-                                     "../../data/datadir_local/qats/qats/call_qats_indices")
-
-            qats_ok, qats_stdout = task_execution.call_subprocess_and_catch_stdout(
-                arguments=(qats_path, lc_file, x['m_best'], x['delta_min'], x['delta_max'], x['transit_length'])
-            )
+                         format(x['s_best'], x['m_best'], x['transit_length'] * lc_time_step_days))
+
+            # Run QATS, saving a copy of its output as we parse it
+            qats_ok = True
+            try:
+                with open(os.path.join(tmp_dir.tmp_dir, "final.qats"), "wt") as f:
+                    qats_values = parse_qats_output(qats_stdout=copy_lines_to_file(
+                        lines=task_execution.call_subprocess_and_iterate_stdout(
+                            arguments=(qats_indices_path, lc_file,
+                                       x['m_best'], x['delta_min'], x['delta_max'], x['transit_length'])
+                        ),
+                        file=f
+                    ))
+            except subprocess.CalledProcessError:
+                qats_ok = False
 
             if qats_ok:
                 # QATS returned no error
 
-                # Save output
-                with open(os.path.join(tmp_dir.tmp_dir, "final.qats"), "wb") as f:
-                    f.write(qats_stdout)
-
-                # Loop over lines of output and read S_best and M_best
-                for line in qats_stdout.decode('utf-8').split('\n'):
-                    line = line.strip()
-                    # Ignore comment lines
-                    if (len(line) < 1) or (line[0] == '#'):
-                        continue
-
-                    # Split line into words
-                    words = line.split()
-                    if len(words) == 2:
-                        try:
-                            counter = int(words[0])  # Transit number
-                            position = int(words[1])  # Position within time sequence
-
-                            transit_list.append({
-                                'counter': counter,
-                                'position': position,
-                                'time': lc_fixed_step.get_time_of_point(index=position)
-                            })
-                        except ValueError:
-                            logging.warning("Could not parse QATS indices output")
-
-        # Store tarball of debugging files
-        cwd = os.getcwd()
-        os.chdir(tmp_dir.tmp_dir)
-        # logging.info(task_execution.call_subprocess_and_catch_stdout("ls".split())[1])
-        task_execution.call_subprocess_and_catch_stdout(
-            ["tar", "cvfz", "/tmp/qats_debugging.tar.gz"] + glob.glob("*.qats")
-        )
-        os.chdir(cwd)
+                # Read the transit number, and the position of each transit within the time sequence
+                if qats_values.size > 0:
+                    transit_list = [
+                        {
+                            'counter': int(counter),
+                            'position': int(position),
+                            'time': lc_fixed_step.get_time_of_point(index=int(position))
+                        }
+                        for counter, position in qats_values
+                    ]
+
+        # Store tarball of debugging files, if requested
+        if debug:
+            debugging_files = (glob.glob(os.path.join(tmp_dir.tmp_dir, "*.qats")) +
+                               glob.glob(os.path.join(tmp_dir.tmp_dir, "*.npy")))
+            with tarfile.open(debugging_tarball, "w:gz", compresslevel=1) as tar:
+                for item in sorted(debugging_files):
+                    tar.add(item, arcname=os.path.basename(item))
 
     # Start building output data structure
     results = {
@@ -49,27 +49,29 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
 
     # Process lightcurve
     search_settings = execution_attempt.task_object.task_description.get('search_settings', {})
-    x = qats.process_lightcurve(lc=lc_in, lc_duration=lc_duration, search_settings=search_settings)
+    debug = qats.debugging_enabled(task_description=execution_attempt.task_object.task_description)
+    x = qats.process_lightcurve(lc=lc_in, lc_duration=lc_duration, search_settings=search_settings, debug=debug)
 
     # Extract output
     qats_output, output_extended = x
 
     # Import debugging data into the task database
-    with task_database.TaskDatabaseConnection() as task_db:
-        task_db.execution_attempt_register_output(
-            execution_attempt=execution_attempt,
-            output_name="debugging",
-            file_path="/tmp/qats_debugging.tar.gz",
-            preserve=False,
-            file_metadata={**qats_output}
-        )
+    if debug:
+        with task_database.TaskDatabaseConnection() as task_db:
+            task_db.execution_attempt_register_output(
+                execution_attempt=execution_attempt,
+                output_name="debugging",
+                file_path=qats.debugging_tarball,
+                preserve=False,
+                file_metadata={**qats_output}
+            )
 
     # Test whether transit-detection was successful
     qc_metadata = quality_control.transit_detection_quality_control(lc=lc_in, metadata=qats_output)
 
     # Propagate some metadata from input lightcurve to transit-detection results
-    for item in ['integrated_transit_power', 'pixels_in_transit', 'pixels_in_transit', 'mes']:
-        qats_output[item] = lc_in.metadata.get(item, None)
+    qats_output.update({item: lc_in.metadata.get(item, None)
+                        for item in quality_control.propagated_metadata_keys})
 
     # Open a connection to the task database
     with task_database.TaskDatabaseConnection() as task_db:
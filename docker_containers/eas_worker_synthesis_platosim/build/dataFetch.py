@@ -6,14 +6,21 @@
 Automatically download all of the required data files from the internet.
 """
 
+import email.utils
 import logging
 import os
+import shutil
 import sys
+import tarfile
+import urllib.error
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
 
 
 def fetch_file(web_address, destination, force_refresh=False):
     """
-    Download a file that we need, using wget.
+    Download a file that we need.
 
     :param web_address:
         The URL that we should use to fetch the file
@@ -33,24 +40,90 @@ def fetch_file(web_address, destination, force_refresh=False):
     logging.info("Fetching file <{}>".format(destination))
 
     # Check if the file already exists
+    request_headers = {}
     if os.path.exists(destination):
         if not force_refresh:
             logging.info("File already exists. Not downloading fresh copy.")
             return False
         else:
-            logging.info("File already exists, but downloading fresh copy.")
-            os.unlink(destination)
+            # Ask the server to only send a fresh copy if the file has changed since we downloaded it
+            logging.info("File already exists, but checking for a fresh copy.")
+            request_headers['If-Modified-Since'] = email.utils.formatdate(os.path.getmtime(destination),
+                                                                          usegmt=True)
+            if os.path.exists(etag_path(destination)):
+                with open(etag_path(destination)) as f:
+                    request_headers['If-None-Match'] = f.read().strip()
+
+    # Fetch the file, streaming it to a temporary file so that an interrupted download is never mistaken for a
+    # complete one
+    partial_destination = "{}.part".format(destination)
+    request = urllib.request.Request(web_address, headers=request_headers)
+    try:
+        with urllib.request.urlopen(request) as response, open(partial_destination, "wb") as output:
+            shutil.copyfileobj(response, output, length=1 << 20)
+            etag = response.headers.get('ETag')
+            content_length = response.headers.get('Content-Length')
+    except OSError as error:
+        # Do not leave a partial download behind
+        if os.path.exists(partial_destination):
+            os.unlink(partial_destination)
+        if isinstance(error, urllib.error.HTTPError) and error.code == 304:
+            logging.info("File has not changed on the server. Not downloading fresh copy.")
+            return False
+        raise IOError("Could not download file <{}>".format(web_address))
 
-    # Fetch the file with wget
-    os.system("wget -q '{}' -O {}".format(web_address, destination))
+    # Check that we received the whole file
+    if content_length is not None and os.path.getsize(partial_destination) != int(content_length):
+        os.unlink(partial_destination)
+        raise IOError("Download of file <{}> was truncated".format(web_address))
 
-    # Check that the file now exists
-    if not os.path.exists(destination):
-        raise IOError("Could not download file <{}>".format(web_address))
+    # Move the downloaded file into place, and record its ETag so we can check for changes next time
+    os.replace(partial_destination, destination)
+    if etag is not None:
+        with open(etag_path(destination), "w") as f:
+            f.write(etag)
 
     return True
 
 
+def etag_path(destination):
+    """
+    Return the path of the sidecar file in which we record the ETag of a downloaded file.
+
+    :param destination:
+        The path of the downloaded file
+    :type destination:
+        str
+    :return:
+        str
+    """
+    return "{}.etag".format(destination)
+
+
+def extract_tarball(tarball, destination):
+    """
+    Extract the contents of a gzipped tarball.
+
+    :param tarball:
+        The path of the tarball to extract
+    :type tarball:
+        str
+    :param destination:
+        The directory we should extract the tarball's contents into
+    :type destination:
+        str
+    :return:
+        None
+    """
+    os.makedirs(destination, exist_ok=True)
+    with tarfile.open(tarball, "r:gz") as tar:
+        # Where this Python supports it, stop archive members from being written outside the target directory
+        if hasattr(tarfile, 'data_filter'):
+            tar.extractall(path=destination, filter='data')
+        else:
+            tar.extractall(path=destination)
+
+
 def fetch_required_files():
     # List of the files we require
     required_files = [
@@ -72,27 +145,28 @@ def fetch_required_files():
         }
     ]
 
-    # Fetch all the files
-    for required_file in required_files:
-        fetch_file(web_address=required_file['url'],
-                   destination=required_file['destination'],
-                   force_refresh=required_file['force_refresh']
-                   )
+    # Fetch all the files in parallel
+    with ThreadPoolExecutor(max_workers=len(required_files)) as executor:
+        downloads = [executor.submit(fetch_file,
+                                     web_address=required_file['url'],
+                                     destination=required_file['destination'],
+                                     force_refresh=required_file['force_refresh']
+                                     )
+                     for required_file in required_files]
+
+        # Raise any errors which occurred during the downloads
+        for download in downloads:
+            download.result()
 
     # Unzip PSLS data files
-    os.system("""
-mkdir -p datadir_input/psls_data
-cd datadir_input/psls_data
-tar zxf ../psls-1.3.tar.gz
-""")
+    extract_tarball(tarball="datadir_input/psls-1.3.tar.gz",
+                    destination="datadir_input/psls_data")
 
     # Unzip the PSLS star frequency models
-    os.system("""
-mkdir -p datadir_input/psls_models
-cd datadir_input/psls_models
-tar zxf ../m0y24h.tar_.gz
-tar zxf ../m0y27l.tar_.gz
-""")
+    extract_tarball(tarball="datadir_input/m0y24h.tar_.gz",
+                    destination="datadir_input/psls_models")
+    extract_tarball(tarball="datadir_input/m0y27l.tar_.gz",
+                    destination="datadir_input/psls_models")
 
 
 if __name__ == "__main__":
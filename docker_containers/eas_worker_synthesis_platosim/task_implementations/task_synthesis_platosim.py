@@ -8,7 +8,7 @@ Implementation of the EAS pipeline task <synthesis_platosim>.
 
 import time
 
-from plato_wp36 import task_database, task_execution
+from plato_wp36 import settings, task_database, task_execution
 
 
 @task_execution.eas_pipeline_task
@@ -22,8 +22,11 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
         None
     """
 
-    # Perform the null task
-    time.sleep(10)
+    # PlatoSim is not yet integrated, so this is a null task. For testing the scheduler, it can be made to take a
+    # finite amount of time, by setting <stub_task_delay> in the installation settings.
+    stub_task_delay = float(settings.Settings().installation_info.get('stub_task_delay', 0))
+    if stub_task_delay > 0:
+        time.sleep(stub_task_delay)
 
 
 if __name__ == "__main__":
@@ -20,20 +20,14 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
         None
     """
 
-    # Open a connection to the task database
-    task_db = task_database.TaskDatabaseConnection()
-
-    # Mark QC outcome
-    for output_file in execution_attempt.output_files.values():
-        task_db.file_version_update(product_version_id=output_file.product_version_id,
-                                    passed_qc=True)
-
-    task_db.execution_attempt_update(attempt_id=execution_attempt.attempt_id,
-                                     all_products_passed_qc=True)
-
-    # Close database
-    task_db.commit()
-    task_db.close_db()
+    # Open a connection to the task database, which is committed and closed when the with block exits
+    with task_database.TaskDatabaseConnection() as task_db:
+        # Mark QC outcome
+        product_version_ids = [item.product_version_id for item in execution_attempt.output_files.values()]
+        task_db.file_versions_update_qc(product_version_ids=product_version_ids, passed_qc=True)
+
+        task_db.execution_attempt_update(attempt_id=execution_attempt.attempt_id,
+                                         all_products_passed_qc=True)
 
 
 if __name__ == "__main__":
@@ -6,7 +6,7 @@ Class for synthesising lightcurves using Batman.
 """
 
 import multiprocessing
-from math import asin, pi, sqrt
+from math import asin, ceil, cos, floor, pi, sin, sqrt
 
 from typing import Optional
 
@@ -15,6 +15,9 @@ import numpy as np
 from plato_wp36 import lightcurve
 from plato_wp36.constants import EASConstants
 
+# Number of CPU cores available to this process
+available_cpu_count = multiprocessing.cpu_count()
+
 
 class BatmanWrapper:
     """
@@ -74,6 +77,9 @@ class BatmanWrapper:
         # Look up EAS table of constants
         self.constants = EASConstants()
 
+        # Number of Jupiter radii in one AU
+        self.au_in_jupiter_radii = self.constants.phy_AU / self.constants.jupiter_radius
+
         # Create dictionary of default settings
         self.settings = {
             'duration': 730,  # days
@@ -91,6 +97,15 @@ class BatmanWrapper:
             'threads': 1  # Number of threads to use. None means use all available CPU core. DO NOT SET != 1!!!
         }
 
+        # Cache of time rasters and noise buffers we have already created, indexed by (duration, sampling_cadence)
+        self.raster_cache = {}
+
+        # Random number generator used to inject noise into lightcurves
+        self.random_generator = np.random.default_rng()
+
+        # Cache of Batman models we have already initialised, indexed by (duration, sampling_cadence, threads)
+        self.model_cache = {}
+
         self.configure(duration=duration, eccentricity=eccentricity, t0=t0,
                        star_radius=star_radius, planet_radius=planet_radius,
                        orbital_period=orbital_period, semi_major_axis=semi_major_axis,
@@ -124,6 +139,8 @@ class BatmanWrapper:
         """
 
         self.active = False
+        self.raster_cache = {}
+        self.model_cache = {}
 
     def configure(self,
                   duration: Optional[float] = None,
@@ -175,39 +192,88 @@ class BatmanWrapper:
             DO NOT SET != 1 (why??)
         """
 
-        # Create dictionary of settings
-        if duration is not None:
-            self.settings['duration'] = float(duration)
-        if eccentricity is not None:
-            self.settings['eccentricity'] = float(eccentricity)
-        if t0 is not None:
-            self.settings['t0'] = float(t0)
-        if star_radius is not None:
-            self.settings['star_radius'] = float(star_radius)
-        if planet_radius is not None:
-            self.settings['planet_radius'] = float(planet_radius)
-        if orbital_period is not None:
-            self.settings['orbital_period'] = float(orbital_period)
-        if semi_major_axis is not None:
-            self.settings['semi_major_axis'] = float(semi_major_axis)
+        # Update all the numerical settings which have been specified
+        float_settings = {
+            'duration': duration,
+            'eccentricity': eccentricity,
+            't0': t0,
+            'star_radius': star_radius,
+            'planet_radius': planet_radius,
+            'orbital_period': orbital_period,
+            'semi_major_axis': semi_major_axis,
+            'noise': noise,
+            'mes_assume_noise': mes_assume_noise,
+            'sampling_cadence': sampling_cadence
+        }
+        self.settings.update({key: float(value) for key, value in float_settings.items() if value is not None})
+
+        # Orbital inclination may be specified either as an angle or as an impact parameter, but not both
         if orbital_angle is not None:
             self.settings['orbital_angle'] = float(orbital_angle)
             self.settings['impact_parameter'] = None
         if impact_parameter is not None:
             self.settings['impact_parameter'] = float(impact_parameter)
             self.settings['orbital_angle'] = None
-        if noise is not None:
-            self.settings['noise'] = float(noise)
-        if mes_assume_noise is not None:
-            self.settings['mes_assume_noise'] = float(mes_assume_noise)
-        if sampling_cadence is not None:
-            self.settings['sampling_cadence'] = float(sampling_cadence)
+
         if threads is not None:
             self.settings['threads'] = int(threads)
 
-    def synthesise(self):
+    @staticmethod
+    def transit_half_duration(params: batman.TransitParams):
         """
-        Synthesise a lightcurve using Batman
+        Estimate half the duration of each transit, from first to fourth contact, assuming a circular orbit.
+
+        :param params:
+            The Batman parameters describing the planet's orbit, with distances in units of stellar radii.
+        :return:
+            Half the transit duration (days). Zero if the planet never passes in front of the star, or None if the
+            orbit is eccentric and we cannot make an estimate.
+        """
+
+        # We only estimate transit durations for circular orbits
+        if params.ecc != 0:
+            return None
+
+        # Work out the length of the chord that the planet traces across the star (Winn 2010, equation 14)
+        inclination = params.inc * pi / 180
+        impact_parameter = params.a * cos(inclination)
+        chord_squared = (1 + params.rp) ** 2 - impact_parameter ** 2
+        if chord_squared <= 0:
+            return 0
+        chord = sqrt(chord_squared)
+
+        # If the planet's orbit lies within the chord, then it is always in front of the star
+        orbit_projected_radius = params.a * sin(inclination)
+        if orbit_projected_radius <= chord:
+            return params.per / 2
+
+        return params.per / (2 * pi) * asin(chord / orbit_projected_radius)
+
+    def time_raster(self):
+        """
+        Return the time raster for the lightcurve we are to synthesise. The times are shared between all the calls
+        which use the same raster, so must never be modified in place, nor handed to a lightcurve without copying.
+
+        :return:
+            Tuple of (times (days), float32 scratch buffer for noise)
+        """
+
+        duration = self.settings['duration']  # days
+        time_step = self.settings['sampling_cadence']  # seconds
+        raster_key = (duration, time_step)
+        if raster_key not in self.raster_cache:
+            raster_step = time_step / 86400  # days
+            raster_length = ceil(duration * 86400 / time_step)
+            t = np.linspace(0., raster_length * raster_step, raster_length, endpoint=False)
+            self.raster_cache[raster_key] = (t, np.empty_like(t, dtype=np.float32))
+        return self.raster_cache[raster_key]
+
+    def synthesise_transit_model(self):
+        """
+        Synthesise the noise-free transit signal using Batman, on the raster returned by <time_raster>.
+
+        :return:
+            Numpy array of relative fluxes, which are exactly one outside of transit
         """
 
         assert self.active, "This synthesiser instance has been closed."
@@ -225,16 +291,12 @@ class BatmanWrapper:
         params.rp = self.settings['planet_radius'] / self.settings['star_radius']
 
         # semi-major axis (convert into units of stellar radii)
-        params.a = (self.settings['semi_major_axis'] * (self.constants.phy_AU / self.constants.jupiter_radius) /
-                    self.settings['star_radius'])
+        params.a = self.settings['semi_major_axis'] * self.au_in_jupiter_radii / self.settings['star_radius']
 
         # Work out inclination of orbit, which may be specified either as an inclination to the line of sight (degrees)
         # or as an impact parameter (0-1).
         if self.settings['impact_parameter'] is not None:
-            orbital_angle = asin(self.settings['impact_parameter'] * self.settings['star_radius'] /
-                                 (self.settings['semi_major_axis'] * (
-                                         self.constants.phy_AU / self.constants.jupiter_radius))
-                                 ) * 180 / pi
+            orbital_angle = asin(self.settings['impact_parameter'] / params.a) * 180 / pi
         else:
             orbital_angle = self.settings['orbital_angle']
         params.inc = 90 - orbital_angle
@@ -254,60 +316,121 @@ class BatmanWrapper:
         # How many threads should we use?
         thread_count = self.settings['threads']
         if thread_count is None:
-            thread_count = multiprocessing.cpu_count()
+            thread_count = available_cpu_count
         thread_count = max(thread_count, 1)
-        thread_count = min(thread_count, multiprocessing.cpu_count())
+        thread_count = min(thread_count, available_cpu_count)
 
-        # Create raster for output lightcurve
+        # Fetch the raster for the output lightcurve
+        duration = self.settings['duration']  # days
         time_step = self.settings['sampling_cadence']  # seconds
         raster_step = time_step / 86400  # days
-        t = np.arange(0., self.settings['duration'], raster_step)
-
-        # Synthesise lightcurve
-        m = batman.TransitModel(params=params, t=t, nthreads=thread_count)  # initializes model
-        flux = m.light_curve(params=params)  # calculates light curve
-        errors = np.zeros_like(t)
+        t = self.time_raster()[0]
+
+        # Estimate the duration of each transit. If we can't (because the orbit is eccentric), evaluate Batman over
+        # the whole lightcurve. Otherwise, only evaluate it close to each transit, since the flux is one elsewhere.
+        transit_half_duration = self.transit_half_duration(params=params)
+
+        if transit_half_duration is None:
+            # Initialise a Batman model on this raster. We reuse models from previous calls on the same raster, since
+            # <light_curve> recomputes the planet's orbit if its parameters have changed.
+            model_key = (duration, time_step, thread_count)
+            if model_key not in self.model_cache:
+                self.model_cache[model_key] = batman.TransitModel(params=params, t=t, nthreads=thread_count)
+            m = self.model_cache[model_key]
+
+            # Synthesise lightcurve
+            flux = m.light_curve(params=params)  # calculates light curve
+        else:
+            flux = np.ones_like(t)
+
+            # Work out which transits fall within the lightcurve, padding the estimated duration to be conservative
+            window_half_width = 1.1 * transit_half_duration + raster_step  # days
+            first_transit_index = ceil((-window_half_width - params.t0) / params.per)
+            last_transit_index = floor((duration + window_half_width - params.t0) / params.per)
+
+            # If there are no transits, the lightcurve is flat, and we don't need to run Batman
+            if transit_half_duration > 0 and last_transit_index >= first_transit_index:
+                # Find the samples which lie within a window around any of the transits
+                transit_centres = params.t0 + params.per * np.arange(first_transit_index, last_transit_index + 1)
+                window_starts = np.searchsorted(t, transit_centres - window_half_width)
+                window_ends = np.searchsorted(t, transit_centres + window_half_width)
+                window_count = np.zeros(len(t) + 1, dtype=np.int64)
+                np.add.at(window_count, window_starts, 1)
+                np.add.at(window_count, window_ends, -1)
+                near_transit = np.cumsum(window_count[:-1]) > 0
+
+                # Synthesise lightcurve near to transits. This model is small and quick to initialise, so not cached.
+                if np.any(near_transit):
+                    m = batman.TransitModel(params=params, t=t[near_transit], nthreads=thread_count)
+                    flux[near_transit] = m.light_curve(params=params)
+
+        return flux
+
+    def transit_statistics(self, flux: np.ndarray):
+        """
+        Calculate the multiple event statistic (MES), and related metadata, for a noise-free transit signal.
 
-        # Work out noise level per pixel
-        noise_per_pixel = self.settings['noise'] * sqrt(25 / time_step)
+        :param flux:
+            Noise-free relative fluxes, as returned by <synthesise_transit_model>
+        :return:
+            Dictionary of metadata
+        """
 
+        # Work out noise level per pixel, which scales with 1/sqrt(integration time) relative to 25-sec cadence
+        noise_scaling = sqrt(25 / self.settings['sampling_cadence'])
         if self.settings['mes_assume_noise'] is not None:
-            mes_assume_noise_per_pixel = self.settings['mes_assume_noise'] * sqrt(25 / time_step)
+            mes_assume_noise_per_pixel = self.settings['mes_assume_noise'] * noise_scaling
         else:
-            mes_assume_noise_per_pixel = noise_per_pixel
+            mes_assume_noise_per_pixel = self.settings['noise'] * noise_scaling
 
-        # Calculate multiple event statistic (MES) for this LC
-        integrated_transit_power = np.sum(np.ones_like(flux) - flux)
-        pixels_in_transit = np.count_nonzero(flux < 1)
+        # Batman returns a flux of exactly one outside of transit, so we only need to sum over in-transit samples
+        in_transit = flux < 1
+        pixels_in_transit = np.count_nonzero(in_transit)
+        integrated_transit_power = float(pixels_in_transit - np.sum(flux[in_transit]))
         pixels_out_of_transit = len(flux) - pixels_in_transit
+
+        # Calculate MES. Infinite (or very large) values are capped at a large number, since database cannot hold <inf>
+        mes_maximum = 1e8
         if pixels_in_transit < 1:
             mes = 0
         elif mes_assume_noise_per_pixel <= 0:
-            mes = np.inf
+            mes = mes_maximum
         else:
-            mes = integrated_transit_power / mes_assume_noise_per_pixel / sqrt(pixels_in_transit)
+            mes = min(integrated_transit_power / mes_assume_noise_per_pixel / sqrt(pixels_in_transit), mes_maximum)
 
-        # Convert infinite MES values into a large number, since database cannot hold< inf>
-        if mes > 1e8:
-            mes = 1e8
-
-        # Add noise to lightcurve
-        noise = np.random.normal(0, noise_per_pixel, size=len(flux))
-        flux += noise
-
-        # Output metadata
-        output_metadata = {
+        return {
             'integrated_transit_power': integrated_transit_power,
             'pixels_in_transit': pixels_in_transit,
             'pixels_out_of_transit': pixels_out_of_transit,
             'mes': mes
         }
 
-        # Write Batman output into lightcurve archive
+    def synthesise(self):
+        """
+        Synthesise a lightcurve using Batman
+        """
+
+        assert self.active, "This synthesiser instance has been closed."
+
+        # Synthesise the noise-free transit signal, and calculate its MES
+        t, noise_buffer = self.time_raster()
+        flux = self.synthesise_transit_model()
+        output_metadata = self.transit_statistics(flux=flux)
+
+        # Add noise to lightcurve, generating it in place in a reusable buffer. Single precision is ample for noise, and
+        # halves the memory traffic; the fluxes themselves remain double precision.
+        noise_per_pixel = self.settings['noise'] * sqrt(25 / self.settings['sampling_cadence'])
+        if noise_per_pixel > 0:
+            self.random_generator.standard_normal(dtype=np.float32, out=noise_buffer)
+            noise_buffer *= np.float32(noise_per_pixel)
+            flux += noise_buffer
+
+        # Write Batman output into lightcurve archive, with its own copy of the cached time raster, so that changes to
+        # the lightcurve cannot corrupt the cache
         lc = lightcurve.LightcurveArbitraryRaster(
-            times=t,  # days
+            times=t.copy(),  # days
             fluxes=flux,
-            uncertainties=errors,
+            uncertainties=np.zeros_like(t),
             metadata={**self.settings, **output_metadata}
         )
 
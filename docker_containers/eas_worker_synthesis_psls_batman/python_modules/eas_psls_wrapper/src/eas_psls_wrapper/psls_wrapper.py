@@ -5,11 +5,10 @@
 Class for synthesising lightcurves using PSLS.
 """
 
-import glob
-import hashlib
 import os
-import random
 import time
+import uuid
+from functools import lru_cache
 from math import asin, pi
 
 from typing import Optional
@@ -20,6 +19,31 @@ from plato_wp36 import settings, lightcurve, task_execution, temporary_directory
 from plato_wp36.constants import EASConstants
 
 
+@lru_cache(maxsize=None)
+def read_yaml_template(mode: str):
+    """
+    Read the template for the YAML configuration file we pass to PSLS. Templates never change while the pipeline is
+    running, so we only read each one from disk once.
+
+    :param mode:
+        The PSLS mode we are to run in, either "main_sequence" or "red_giant".
+    :return:
+        String containing the template
+    """
+
+    # Find template to use for PSLS configuration
+    path_to_yaml_templates = os.path.split(os.path.abspath(__file__))[0]
+    yaml_template_filename = os.path.join(path_to_yaml_templates, "{}_template.yaml".format(mode))
+
+    assert os.path.exists(yaml_template_filename), \
+        """Could not find PSLS template for mode <{}>. Recognised modes are "main_sequence" or "red_giant".\
+           File <{}> does not exist.\
+        """.format(mode, yaml_template_filename)
+
+    with open(yaml_template_filename) as f:
+        return f.read()
+
+
 class PslsWrapper:
     """
     Class for synthesising lightcurves using PSLS.
@@ -255,29 +279,20 @@ class PslsWrapper:
 
         assert self.active, "This synthesiser instance has been closed."
 
-        # Switch into our temporary working directory where PSLS can find all its input files
-        cwd = os.getcwd()
-        os.chdir(self.tmp_dir.tmp_dir)
+        # Our temporary working directory, where PSLS can find all its input files
+        working_directory = self.tmp_dir.tmp_dir
 
         # Create unique ID for this run
         utc = time.time()
-        key = "{}_{}".format(utc, random.random())
         tstr = time.strftime("%Y%m%d_%H%M%S", time.gmtime(utc))
-        uid = hashlib.md5(key.encode()).hexdigest()
+        uid = uuid.uuid4().hex
         run_identifier = "{}_{}".format(tstr, uid)[0:32]
 
         # Find template to use for PSLS configuration
-        path_to_yaml_templates = os.path.split(os.path.abspath(__file__))[0]
-        yaml_template_filename = os.path.join(path_to_yaml_templates, "{}_template.yaml".format(self.settings['mode']))
-
-        assert os.path.exists(yaml_template_filename), \
-            """Could not find PSLS template for mode <{}>. Recognised modes are "main_sequence" or "red_giant".\
-               File <{}> does not exist.\
-            """.format(self.settings['mode'], yaml_template_filename)
+        yaml_template = read_yaml_template(mode=self.settings['mode'])
 
         # Make filename for YAML configuration file for PSLS
-        yaml_template = open(yaml_template_filename).read()
-        yaml_filename = "{}.yaml".format(run_identifier)
+        yaml_filename = os.path.join(working_directory, "{}.yaml".format(run_identifier))
 
         # Work out inclination of orbit, which may be specified either as an inclination to the line of sight (degrees)
         # or as an impact parameter (0-1).
@@ -304,95 +319,88 @@ class PslsWrapper:
         run_in_time = self.settings['orbital_period'] - self.settings['t0']  # days
         simulation_duration = run_in_time + self.settings['duration'] + 1
 
+        # Work out which samples of the PSLS output fall within the segment we are to return to the user
+        cadence_days = self.settings['sampling_cadence'] / 86400.
+        run_in_samples = int(run_in_time / cadence_days)
+        final_length = int(self.settings['duration'] / cadence_days)
+        segment = slice(run_in_samples, run_in_samples + final_length)
+
+        # Values to substitute into the YAML configuration template
+        template_values = {
+            'duration': simulation_duration,
+            'master_seed': int(self.settings['master_seed']),
+            'nsr': float(self.settings['nsr']),
+            'datadir_local': self.eas_settings.settings['localDataPath'],
+            'enable_transits': int(self.settings['enable_transits']),
+            'planet_radius': float(self.settings['planet_radius']),
+            'orbital_period': float(self.settings['orbital_period']),
+            'semi_major_axis': float(self.settings['semi_major_axis']),
+            'orbital_angle': float(orbital_angle),
+            'sampling_cadence': float(self.settings['sampling_cadence']),
+            'integration_time': float(self.settings['sampling_cadence']) * 22 / 25,
+            'systematics': systematics_file,
+            'enable_systematics': int(enable_systematics),
+            'noise_type': "PLATO_SIMU" if enable_systematics else "PLATO_SCALING",
+            'enable_random_noise': int(enable_random_noise),
+            'number_camera_groups': int(number_camera_groups),
+            'number_cameras_per_group': int(number_cameras_per_group)
+        }
+
         # Create YAML configuration file for PSLS
         with open(yaml_filename, "w") as out:
-            out.write(
-                yaml_template.format(
-                    duration=simulation_duration,
-                    master_seed=int(self.settings['master_seed']),
-                    nsr=float(self.settings['nsr']),
-                    datadir_local=self.eas_settings.settings['localDataPath'],
-                    enable_transits=int(self.settings['enable_transits']),
-                    planet_radius=float(self.settings['planet_radius']),
-                    orbital_period=float(self.settings['orbital_period']),
-                    semi_major_axis=float(self.settings['semi_major_axis']),
-                    orbital_angle=float(orbital_angle),
-                    sampling_cadence=float(self.settings['sampling_cadence']),
-                    integration_time=float(self.settings['sampling_cadence']) * 22 / 25,
-                    systematics=systematics_file,
-                    enable_systematics=int(enable_systematics),
-                    noise_type="PLATO_SIMU" if enable_systematics else "PLATO_SCALING",
-                    enable_random_noise=int(enable_random_noise),
-                    number_camera_groups=int(number_camera_groups),
-                    number_cameras_per_group=int(number_cameras_per_group)
-                )
-            )
+            out.write(yaml_template.format_map(template_values))
 
         # Path to PSLS binary
         psls_binary = os.path.join(self.eas_settings.settings['localDataPath'], "virtualenv/bin/psls.py")
 
         # Run PSLS
         psls_executed_ok = task_execution.call_subprocess_and_log_output(
-            arguments=(psls_binary, yaml_filename)
+            arguments=(psls_binary, yaml_filename),
+            cwd=working_directory
         )
         assert psls_executed_ok, "PSLS reported failure"
 
         # Filename of the output that PSLS produced
         psls_output = "0012069449"
 
-        # Read output from PSLS
-        psls_filename = "{}.dat".format(psls_output)
-        data = np.loadtxt(psls_filename).T
-
-        # Read times and fluxes from text file
-        times = data[0]  # seconds
-        fluxes = 1 + 1e-6 * data[1]
-        flags = data[2]
+        # Read times (seconds), fluxes (ppm) and flags from the text file output by PSLS, ignoring any other columns
+        psls_filename = os.path.join(working_directory, "{}.dat".format(psls_output))
+        times, fluxes_ppm, flags = np.loadtxt(psls_filename, dtype=np.float64, usecols=(0, 1, 2), unpack=True)
 
         # Cut out the segment we are to return to the user
-        cadence_days = self.settings['sampling_cadence'] / 3600. / 24.
-        run_in_samples = int(run_in_time / cadence_days)
-        final_length = int(self.settings['duration'] / cadence_days)
+        times = times[segment]
+        flags = flags[segment]
 
-        times = times[run_in_samples: run_in_samples + final_length]
-        fluxes = fluxes[run_in_samples: run_in_samples + final_length]
-        flags = flags[run_in_samples: run_in_samples + final_length]
+        # Convert fluxes from ppm variations into relative fluxes, only within the segment we return
+        fluxes = 1 + 1e-6 * fluxes_ppm[segment]
 
         # Reset start time of lightcurve to zero
         times -= times[0]
 
         # Compute MES statistic. To do this, we need a theoretical model of the pure transit signal, which we
-        # generate using batman.
+        # generate using batman. We only need its metadata, so we don't add noise or build a lightcurve object.
         if not self.settings['enable_transits']:
-            integrated_transit_power = 0
-            pixels_in_transit = 0
-            pixels_out_of_transit = len(times)
-            mes = 0
+            output_metadata = {
+                'integrated_transit_power': 0,
+                'pixels_in_transit': 0,
+                'pixels_out_of_transit': len(times),
+                'mes': 0
+            }
         else:
-            batman_instance = BatmanWrapper(duration=self.settings['duration'],
-                                            eccentricity=0,
-                                            t0=self.settings['t0'],
-                                            star_radius=self.settings['star_radius'],
-                                            planet_radius=self.settings['planet_radius'],
-                                            orbital_period=self.settings['orbital_period'],
-                                            semi_major_axis=self.settings['semi_major_axis'],
-                                            orbital_angle=self.settings['orbital_angle'],
-                                            impact_parameter=self.settings['impact_parameter'],
-                                            noise=self.constants.plato_noise * (self.settings['nsr'] / 73),
-                                            sampling_cadence=self.settings['sampling_cadence']
-                                            )
-            batman_lc = batman_instance.synthesise()
-            integrated_transit_power = batman_lc.metadata['integrated_transit_power']
-            pixels_in_transit = batman_lc.metadata['pixels_in_transit']
-            pixels_out_of_transit = batman_lc.metadata['pixels_out_of_transit']
-            mes = batman_lc.metadata['mes']
-
-        output_metadata = {
-            'integrated_transit_power': integrated_transit_power,
-            'pixels_in_transit': pixels_in_transit,
-            'pixels_out_of_transit': pixels_out_of_transit,
-            'mes': mes
-        }
+            with BatmanWrapper(duration=self.settings['duration'],
+                               eccentricity=0,
+                               t0=self.settings['t0'],
+                               star_radius=self.settings['star_radius'],
+                               planet_radius=self.settings['planet_radius'],
+                               orbital_period=self.settings['orbital_period'],
+                               semi_major_axis=self.settings['semi_major_axis'],
+                               orbital_angle=self.settings['orbital_angle'],
+                               impact_parameter=self.settings['impact_parameter'],
+                               noise=self.constants.plato_noise * (self.settings['nsr'] / 73),
+                               sampling_cadence=self.settings['sampling_cadence']
+                               ) as batman_instance:
+                transit_model = batman_instance.synthesise_transit_model()
+                output_metadata = batman_instance.transit_statistics(flux=transit_model)
 
         # Write Batman output into lightcurve archive
         lc = lightcurve.LightcurveArbitraryRaster(
@@ -403,11 +411,10 @@ class PslsWrapper:
         )
 
         # Make sure there aren't any old data files lying around
-        for dead_file in glob.glob("*.modes") + glob.glob("*.yaml") + glob.glob("*.dat"):
-            os.unlink(dead_file)
-
-        # Switch back into the user's cwd
-        os.chdir(cwd)
+        with os.scandir(working_directory) as directory_entries:
+            for entry in directory_entries:
+                if entry.is_file() and entry.name.endswith((".modes", ".yaml", ".dat")):
+                    os.unlink(entry.path)
 
         # Finished
         return lc
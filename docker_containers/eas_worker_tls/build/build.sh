@@ -20,6 +20,8 @@ sed -i "s|numpy|oldest-supported-numpy|g" pyproject.toml
 cd /plato-wp36-v2/data/datadir_local
 git clone https://github.com/hippke/tls.git
 cd tls
+# Ask numba to cache TLS's compiled kernels on disk, so that they can be compiled once when the image is built
+sed -i "s|nopython=True)|nopython=True, cache=True)|g" transitleastsquares/*.py
 /plato-wp36-v2/data/datadir_local/virtualenv/bin/python3 setup.py install
 
 # Install the Transit Least Squares code via PyPi, but don't use wheels
@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# warm_numba_cache.py
+
+"""
+Run a small transit search through TLS, so that numba compiles its kernels and stores them in NUMBA_CACHE_DIR.
+Workers started from this image then load the cached kernels, rather than compiling them afresh for each task.
+"""
+
+import logging
+import sys
+
+import numpy as np
+from transitleastsquares import transitleastsquares
+
+
+def warm_numba_cache():
+    # Synthetic lightcurve with a box-shaped transit every 0.7 days
+    time = np.linspace(0, 10, 5000)
+    flux = np.ones_like(time)
+    flux[(time % 0.7) < 0.03] = 0.999
+
+    # Run a narrow period search, which exercises the same compiled kernels as a full search
+    model = transitleastsquares(time, flux)
+    model.power(period_min=0.5, period_max=0.9, use_threads=1, show_progress_bar=False)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        stream=sys.stdout,
+                        format='[%(asctime)s] %(levelname)s:%(filename)s:%(message)s',
+                        datefmt='%d/%m/%Y %H:%M:%S')
+    logger = logging.getLogger(__name__)
+    logger.info(__doc__.strip())
+
+    warm_numba_cache()
@@ -25,34 +25,35 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
 
     # Perform the transit detection task
 
-    # Fetch EAS pipeline settings to find out how many threads are allocated to each TLS worker
-    with task_database.TaskDatabaseConnection() as task_db:
-        tls_thread_assigned = task_db.container_get_resource_assignment(container_name='eas_worker_tls')['cpu']
-        tls_thread_count = max(1, int(tls_thread_assigned))
-    logging.info("TLS using {:d} threads".format(tls_thread_count))
-
     # Read specification for the lightcurve we are to verify
     filename_in = execution_attempt.task_object.task_description['inputs']['lightcurve']
     lc_duration = float(execution_attempt.task_object.task_description['lc_duration'])
 
-    logging.info("Running <{filename}> through TLS with duration {lc_days:.1f}.".format(
-        filename=filename_in, lc_days=lc_duration)
-    )
+    # Open a connection to the task database, which we use to read our settings and input
+    with task_database.TaskDatabaseConnection() as task_db:
+        # Fetch EAS pipeline settings to find out how many threads are allocated to each TLS worker
+        tls_thread_assigned = task_db.container_get_resource_assignment(container_name='eas_worker_tls')['cpu']
+        tls_thread_count = max(1, int(tls_thread_assigned))
+        logging.info("TLS using {:d} threads".format(tls_thread_count))
+
+        logging.info("Running <{filename}> through TLS with duration {lc_days:.1f}.".format(
+            filename=filename_in, lc_days=lc_duration)
+        )
 
-    # Read input lightcurve
-    with temporary_directory.TemporaryDirectory() as tmp_dir:
-        with task_database.TaskDatabaseConnection() as task_db:
+        # Read input lightcurve
+        with temporary_directory.TemporaryDirectory() as tmp_dir:
             lc_in_filename, lc_in_metadata = task_db.task_open_file_input(
                 task=execution_attempt.task_object,
                 tmp_dir=tmp_dir,
                 input_name="lightcurve"
             )
-        lc_in = lightcurve.LightcurveArbitraryRaster.from_file(
-            file_path=lc_in_filename,
-            file_metadata=lc_in_metadata
-        )
+            lc_in = lightcurve.LightcurveArbitraryRaster.from_file(
+                file_path=lc_in_filename,
+                file_metadata=lc_in_metadata
+            )
 
-    # Search for transits in this lightcurve
+    # Search for transits in this lightcurve. The database connection is closed while we do this, since the search
+    # may take hours, and an idle connection would hold a transaction open and may be timed out by the server.
     transit_search_settings = execution_attempt.task_object.task_description.get('search_settings', {})
     x = tls.process_lightcurve(lc=lc_in,
                                lc_duration=lc_duration,
@@ -67,12 +68,11 @@ def task_handler(execution_attempt: task_database.TaskExecutionAttempt):
     qc_metadata = quality_control.transit_detection_quality_control(lc=lc_in, metadata=tls_output)
 
     # Propagate some metadata from input lightcurve to transit-detection results
-    for item in ['integrated_transit_power', 'pixels_in_transit', 'pixels_in_transit', 'mes']:
-        tls_output[item] = lc_in.metadata.get(item, None)
+    tls_output.update({item: lc_in.metadata.get(item, None)
+                       for item in quality_control.propagated_metadata_keys})
 
-    # Open a connection to the task database
+    # Reconnect to the task database to log outcome metadata
     with task_database.TaskDatabaseConnection() as task_db:
-        # Log outcome metadata to the database
         task_db.execution_attempt_update(attempt_id=execution_attempt.attempt_id,
                                          metadata={**tls_output, **qc_metadata})
 
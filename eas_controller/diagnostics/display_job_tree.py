@@ -9,6 +9,7 @@ Display the hierarchy of jobs in the database
 import argparse
 import logging
 import os
+import sys
 
 from typing import Dict, Optional
 
@@ -38,9 +39,13 @@ def display_job_tree(job_name: Optional[str] = None, max_depth: Optional[int] =
         output_lines = render_task_tree.fetch_running_job_tree(job_name=job_name, max_depth=max_depth,
                                                                include_recently_finished=True)
 
+    # Render the whole tree, and write it out in one go, rather than printing each line separately
+    lines = []
     for item in output_lines:
-        item['indent'] = " | " * item['level']
-        print('{indent}{job_name}/{task_type_name} ({task_id} - {w}/{r}/{s}/{d})'.format(**item))
+        indent = " | " * item['level']
+        lines.append('{indent}{job_name}/{task_type_name} ({task_id} - {w}/{r}/{s}/{d})\n'.format(indent=indent,
+                                                                                                  **item))
+    sys.stdout.write("".join(lines))
 
 
 if __name__ == "__main__":
@@ -10,14 +10,14 @@ import argparse
 import logging
 import os
 import sys
-from datetime import datetime
+import time
 
 from typing import Optional
 
 from plato_wp36 import settings, task_database
 
 
-def errors_list(job_name: Optional[str] = None, task_type: Optional[str] = None):
+def errors_list(job_name: Optional[str] = None, task_type: Optional[str] = None, limit: Optional[int] = None):
     """
     List error messages stored in the task database.
 
@@ -29,35 +29,48 @@ def errors_list(job_name: Optional[str] = None, task_type: Optional[str] = None)
         Filter results by type of task.
     :type task_type:
         str
+    :param limit:
+        Maximum number of error messages to list.
+    :type limit:
+        int
     """
     output = sys.stdout
 
+    # Filter results in the database, rather than transferring every error message and discarding most of them
+    constraints = ["l.severity >= 40"]
+    arguments = []
+    if job_name is not None:
+        constraints.append("t.jobName = %s")
+        arguments.append(job_name)
+    if task_type is not None:
+        constraints.append("ty.taskTypeName = %s")
+        arguments.append(task_type)
+
+    # Limit the number of error messages listed
+    limit_clause = ""
+    if limit is not None:
+        limit_clause = "LIMIT {:d}".format(int(limit))
+
     # Open connection to the database
     with task_database.TaskDatabaseConnection() as task_db:
-        # Fetch list of error messages
-        task_db.db_handle.parameterised_query("""
+        # Stream error messages from the database, rather than holding them all in memory at once
+        results_list = task_db.db_handle.parameterised_query_iterate("""
 SELECT l.timestamp, l.message, t.jobName, ty.taskTypeName AS taskType
 FROM eas_log_messages l
 LEFT OUTER JOIN eas_scheduling_attempt s ON s.schedulingAttemptId = l.generatedByTaskExecution
 LEFT OUTER JOIN eas_task t ON s.taskId = t.taskId
 LEFT OUTER JOIN eas_task_types ty ON ty.taskTypeId = t.taskTypeId
-WHERE l.severity >= 40
-ORDER BY l.timestamp;
-""")
-        results_list = task_db.db_handle.fetchall()
+WHERE {constraints}
+ORDER BY l.timestamp
+{limit_clause};
+""".format(constraints=" AND ".join(constraints), limit_clause=limit_clause), tuple(arguments))
 
         # Loop over error messages
         for item in results_list:
-            # Filter results
-            if job_name is not None and job_name != item['jobName']:
-                continue
-            if task_type is not None and task_type != item['taskType']:
-                continue
-
             # Display results
-            time_string = datetime.utcfromtimestamp(item['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            time_string = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(item['timestamp']))
             output.write("{} |{:36s}|{:18s}|{}\n".format(
-                str(time_string), str(item['jobName']), str(item['taskType']), str(item['message']).strip()
+                time_string, str(item['jobName']), str(item['taskType']), str(item['message']).strip()
             ))
 
 
@@ -66,6 +79,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument('--job-name', default=None, type=str, dest='job_name', help='Filter results by job name')
     parser.add_argument('--task-type', default=None, type=str, dest='task_type', help='Filter results by task type')
+    parser.add_argument('--limit', default=None, type=int, dest='limit',
+                        help='Maximum number of error messages to list')
     args = parser.parse_args()
 
     # Fetch EAS pipeline settings
@@ -84,4 +99,4 @@ if __name__ == "__main__":
     logger.info(__doc__.strip())
 
     # Dump results
-    errors_list(job_name=args.job_name, task_type=args.task_type)
+    errors_list(job_name=args.job_name, task_type=args.task_type, limit=args.limit)
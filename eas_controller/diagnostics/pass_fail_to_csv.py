@@ -41,19 +41,11 @@ def pass_fail_to_csv(job_name: Optional[str] = None, task_type: Optional[str] =
         output.write("\n\n{}\n\n".format(table['title']))
 
         # Display column headings
-        output.write("# ")
-        for item in table['column_headings']:
-            output.write("{:12.12}  ".format(item))
-        output.write("\n")
-
-        # Display results
-        for row in table['data_rows']:
-            # Display parameter values
-            for item in row['row_str']:
-                output.write("{:12.12s}  ".format(str(item)))
-
-            # New line
-            output.write("\n")
+        output.write("# " + "".join(["{:12.12}  ".format(item) for item in table['column_headings']]) + "\n")
+
+        # Display results, building the whole table before writing it out
+        output.write("".join(["".join(["{:12.12s}  ".format(str(item)) for item in row['row_str']]) + "\n"
+                              for row in table['data_rows']]))
 
 
 if __name__ == "__main__":